@@ -1,545 +1,406 @@
-import streamlit as st
-from bs4 import BeautifulSoup
-import requests
-import openai
-from urllib.parse import urljoin, urlparse
+import functools
+import logging
+import threading
+from concurrent.futures import as_completed, wait
 
-# Try to import error classes from the new location; fall back if not available.
-try:
-    from openai.error import APIError, APIConnectionError, RateLimitError, OpenAIError
-except ModuleNotFoundError:
-    # If the error module isn’t found, use the base Exception for all error types.
-    APIError = APIConnectionError = RateLimitError = OpenAIError = Exception
+import openai
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from seoauditor import (
+    MD,
+    TT,
+    AnchorTextAudit,
+    AuditJob,
+    CrawlJob,
+    H1Audit,
+    ImageAudit,
+    JobStore,
+    LinkingAudit,
+    accessibility_insights,
+    analyze_pagespeed_data,
+    crawlability_insights,
+    get_pagespeed_reports,
+    gpt_cache,
+)
+from seoauditor.results import MULTIPLE_H1, NO_H1, NO_META, NO_TITLE
+from seoauditor.sitemaps import SITEMAP_ISSUE_CODES
+from seoauditor.instrument import slowest_spans, summarize, to_json_lines, to_prometheus, tracer
 
 # Initialize OpenAI with API key from Streamlit's secrets
 openai.api_key = st.secrets["openai_api_key"]
 
-# Define headers with a User-Agent to mimic a browser
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.159 Safari/537.36"
-}
+# Audits running on worker threads can't write to the page, so their log messages are collected here.
+section_log = threading.local()
 
-def request_url(url):
-    try:
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()
-        return response
-    except requests.RequestException as e:
-        st.error(f"Error fetching URL: {e}")
-        return None
-
-def safe_request_url(target_url, method='GET'):
-    try:
-        if method.upper() == 'HEAD':
-            response = requests.head(target_url, headers=HEADERS, allow_redirects=True)
+def show_log_message(levelno, message):
+    if levelno >= logging.ERROR:
+        st.error(message)
+    else:
+        st.warning(message)
+
+class StreamlitLogHandler(logging.Handler):
+    # Surfaces the library's fetch and OpenAI errors in the page, as st.error/st.warning did before.
+    def emit(self, record):
+        messages = getattr(section_log, "messages", None)
+        if messages is not None:
+            messages.append((record.levelno, self.format(record)))
+        elif get_script_run_ctx(suppress_warning=True) is not None:
+            show_log_message(record.levelno, self.format(record))
         else:
-            response = requests.get(target_url, headers=HEADERS)
-        response.raise_for_status()
-        return response
-    except requests.RequestException as e:
-        st.warning(f"Error fetching URL: {e}")
-        return None
-
-def get_gpt_insights(prompt):
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",  # Use GPT-4o mini model
-            messages=[
-                {"role": "system", "content": "You are an SEO expert."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response["choices"][0]["message"]["content"].strip()
-    except APIError as e:
-        st.error(f"OpenAI API returned an API Error: {e}")
-        return ""
-    except APIConnectionError as e:
-        st.error(f"Failed to connect to OpenAI API: {e}")
-        return ""
-    except RateLimitError as e:
-        st.error(f"OpenAI API request exceeded rate limit: {e}")
-        return ""
-    except OpenAIError as e:
-        st.error(f"OpenAI API error: {e}")
-        return ""
-
-def TT(url):
-    response = request_url(url)
-    if not response:
-        return "Failed to fetch title", "Error retrieving title from URL"
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    title = soup.title.string if soup.title else None
-    insights = ""
-    
-    if title is None:
-        return "No Title Found", "No title tag detected for the page."
-    elif len(title) < 50:
-        insights += "The title tag is shorter than the recommended 50-60 characters. Consider adding more descriptive keywords or phrases to improve its clarity."
-    elif len(title) > 60:
-        insights += "The title tag is longer than the recommended 50-60 characters. Consider shortening it while retaining its main message."
+            logging.lastResort.handle(record)
+
+# Streamlit re-runs this script on every interaction, so replace the handler rather than stacking copies.
+seoauditor_logger = logging.getLogger("seoauditor")
+for handler in list(seoauditor_logger.handlers):
+    if handler.get_name() == "streamlit":
+        seoauditor_logger.removeHandler(handler)
+streamlit_handler = StreamlitLogHandler(logging.WARNING)
+streamlit_handler.set_name("streamlit")
+seoauditor_logger.addHandler(streamlit_handler)
+seoauditor_logger.propagate = False
+
+def render_title(result):
+    title, title_insights = result
+    st.write(f"**Title Tag Content:** {title}")
+    if title_insights:
+        st.write(f"**Recommendations:** {title_insights}")
+
+def render_meta(result):
+    meta_desc, meta_desc_insights = result
+    if meta_desc:
+        st.write(f"**Meta Description Content:** {meta_desc}")
+        if meta_desc_insights:
+            st.write(f"**Recommendations:** {meta_desc_insights}")
     else:
-        insights += "The title tag is within the recommended length and seems well-optimized. Ensure it's relevant and unique to the content of the page."
-    
-    return title, insights
-
-def MD(url):
-    response = request_url(url)
-    if not response:
-        return "Error retrieving meta description", "Failed to fetch content from URL"
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    meta_description = soup.find('meta', attrs={'name': 'description'})
-    insights = ""
-
-    if meta_description:
-        desc = meta_description['content']
-        
-        if len(desc) < 150:
-            insights += "The meta description is shorter than the recommended 150-160 characters. "
-            insights += "Consider expanding it to provide a more comprehensive summary of the page. "
-        elif len(desc) > 160:
-            insights += "The meta description is longer than the recommended 150-160 characters. "
-            insights += "Consider shortening it to make it concise. "
-        
-        ctas = ['learn more', 'discover', 'find out', 'get started', 'read on']
-        if not any(cta in desc.lower() for cta in ctas):
-            insights += "Consider adding a call to action in the meta description to entice users. "
-        
-        return desc, insights
+        st.write(meta_desc_insights)
+
+def render_h1(result):
+    optimization, details, recommendations = result
+    st.write(f"**Optimization:** {optimization}")
+    st.write(f"**Details:** {details}")
+    st.write(f"**Recommendations:** {recommendations}")
+
+def render_images(image_audit_results):
+    for key, value in image_audit_results.items():
+        st.write(f"**{value[1]}**")
+        if isinstance(value[2], list):
+            for img, suggestion in value[2]:
+                st.write(f"Image: {img}")
+                st.write(f"Suggestion: {suggestion}")
+        else:
+            st.write(value[2])
+        st.write("---")
+
+def render_linking(linking_issues):
+    if linking_issues:
+        for issue_data in linking_issues:
+            st.write("**Issue:**", issue_data["issue"])
+            st.write("**Solution:**", issue_data["solution"])
+            st.write("---")
     else:
-        return None, "❌ Meta description is missing. Consider adding one to provide a brief summary of the page and improve click-through rates from search results."
-
-def H1Audit(url):
-    response = request_url(url)
-    if not response:
-        return "Error fetching URL", "Failed to retrieve content for H1 audit", ""
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    h1_elements = soup.find_all('h1')
-
-    if not h1_elements:
-        optimization = "H1 Missing"
-        details = ("This page doesn't have an H1 heading. H1 headings are crucial for search engines to "
-                   "understand the main topic of a webpage. They provide a clear and concise summary of the "
-                   "content and improve the overall user experience by making the content more scannable and organized. "
-                   "H1 headings also help search engines determine the relevance of a webpage to specific search queries, "
-                   "increasing the chances of ranking higher in search engine results pages (SERPs).")
-        recommendations = ("- Add an H1 heading to the page.\n"
-                           "- Ensure the H1 heading accurately reflects the main topic of the webpage.\n"
-                           "- Use relevant keywords in the H1 heading.\n"
-                           "- Optimize the H1 heading to increase the chances of ranking higher in SERPs.\n"
-                           "- Consider the overall on-page optimization efforts when adding the H1 heading.")
-        return optimization, details, recommendations
-
-    elif len(h1_elements) > 1:
-        optimization = "Multiple H1s Found"
-        details = ("Having multiple H1 headings on a page is not considered best practice from an SEO perspective. "
-                   "H1 headings are used to indicate the main topic or focus of a page, and having multiple H1 headings "
-                   "can confuse search engines and users about the primary content of the page.")
-        h1_texts = [h1.get_text(strip=True) for h1 in h1_elements]
-        primary_h1_suggestion = get_gpt_insights(f"Which should be the primary H1 heading among: {', '.join(h1_texts)}?")
-        recommendations = (f"- Consolidate H1 headings: Choose one primary heading that best reflects the main topic "
-                           f"or focus of the page. In this case, \"{primary_h1_suggestion}\" seems to be the most suitable "
-                           "H1 heading. Remove any other H1 headings on the page.\n"
-                           "- Use subheadings: Use appropriate subheadings such as H2, H3, etc., to organize the information.\n"
-                           "- Optimize for keywords: Ensure the chosen H1 heading includes relevant keywords.\n"
-                           "- Review content structure: Ensure the content flows well and supports the main H1 topic.\n"
-                           "- Test and monitor: Monitor page performance and make adjustments based on data.")
-        return optimization, details, recommendations
-
+        st.write("No internal linking issues found.")
+
+def render_anchors(result):
+    issues, solutions = result[:2]
+    if issues:
+        for issue, solution in zip(issues, solutions):
+            st.write("**Issue:**", issue)
+            st.write("**Solution:**", solution)
+            st.write("---")
     else:
-        optimization = "Single H1 Found"
-        h1_text = h1_elements[0].get_text(strip=True)
-        alternative_h1_suggestion = get_gpt_insights(f"Suggest an alternative SEO-optimized H1 heading for: {h1_text}")
-        details = f"The page has an H1 heading: {h1_text}. It seems to be well-optimized."
-        recommendations = f"Alternative H1 Suggestion for better optimization: {alternative_h1_suggestion}"
-        return optimization, details, recommendations
-
-def ImageAudit(url):
-    response = request_url(url)
-    if not response:
-        return {"error": "Failed to retrieve content for image audit"}
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    img_elements = [img for img in soup.find_all('img') if img.get('src')]
-
-    missing_alt = []
-    existing_alt = []
-    broken_imgs = []
-    non_descriptive_names = []
-
-    base_domain = urlparse(url).netloc
-
-    for img in img_elements:
-        if not img.get('alt'):
-            missing_alt.append(urljoin(url, img['src']))
-        else:
-            existing_alt.append((urljoin(url, img['src']), img['alt']))
-
-        img_src = urljoin(url, img['src'])
-        if base_domain in urlparse(img_src).netloc:
-            img_response = request_url(img_src)
-            if not img_response:
-                broken_imgs.append(img_src)
-
-        img_name = urlparse(img['src']).path.split('/')[-1]
-        if len(img_name.split('-')) <= 1:
-            non_descriptive_names.append(img_src)
-
-    alt_recommendations = []
-    for img_src in missing_alt:
-        img_name = urlparse(img_src).path.split('/')[-1]
-        alt_suggestion = get_gpt_insights(f"Suggest an alt text for the image with filename: {img_name}")
-        alt_recommendations.append((img_src, alt_suggestion))
-
-    improved_alt_texts = []
-    for img_src, alt_text in existing_alt:
-        improved_alt_suggestion = get_gpt_insights(f"Suggest a better alt text for the image with current alt text: {alt_text}")
-        improved_alt_texts.append((img_src, improved_alt_suggestion))
-
-    improved_filenames = []
-    for img_src in non_descriptive_names:
-        img_name = urlparse(img_src).path.split('/')[-1]
-        filename_suggestion = get_gpt_insights(f"Suggest a more descriptive filename for the image with current name: {img_name}")
-        improved_filenames.append((img_src, filename_suggestion))
-
-    return {
-        "missing_alt": (missing_alt, "Images should have alt attributes for accessibility and SEO.", alt_recommendations),
-        "existing_alt": (existing_alt, "Checking the descriptiveness of existing alt texts.", improved_alt_texts),
-        "broken_imgs": (broken_imgs, "Broken images can lead to poor user experience.", "Consider re-uploading or fixing the source of the broken images."),
-        "non_descriptive_names": (non_descriptive_names, "Descriptive image filenames can help with image SEO.", improved_filenames)
-    }
-
-def LinkingAudit(url):
-    try:
-        response = request_url(url)
-        if not response:
-            return [{"issue": "Error fetching URL", "solution": "Failed to retrieve content for linking audit", "example": url}]
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for element in soup.find_all(['header', 'nav', 'footer']):
-            element.extract()
-
-        main_content = soup.find('main') or soup.find('article') or soup.find('section') or soup
-
-        structured_issues = []
-        seen_links = set()
-
-        links = main_content.find_all('a', href=True)
-        base_domain = urlparse(url).netloc
-
-        for link in links:
-            href = link['href']
-            full_url = urljoin(url, href)
-
-            if base_domain in urlparse(full_url).netloc and full_url not in seen_links and not href.startswith('#'):
-                seen_links.add(full_url)
-                
-                link_response = request_url(full_url)
-                if not link_response or link_response.status_code >= 400:
-                    structured_issues.append({
-                        "issue": f"Broken internal link found: {full_url}",
-                        "solution": f"Ensure the link is pointing to the correct location. Status Code: {link_response.status_code if link_response else 'Failed to fetch'}",
-                        "example": href
-                    })
-
-        if not structured_issues:
-            structured_issues.append({
-                "issue": "No internal linking issues found.",
-                "solution": "All internal links on the page seem to be working correctly."
-            })
-
-        return structured_issues
-    except Exception as e:
-        return [{"issue": "Unexpected error during linking audit", "solution": str(e), "example": url}]
-
-def AnchorTextAudit(url):
+        st.write("No anchor text issues found.")
+
+def render_pagespeed(pagespeed_reports):
+    for strategy, pagespeed_data in pagespeed_reports.items():
+        st.write(f"## {strategy.title()}")
+        if "error" in pagespeed_data:
+            st.error(pagespeed_data["error"])
+            continue
+        crux_metrics, lighthouse_metrics = analyze_pagespeed_data(pagespeed_data)
+        st.write("#### Chrome User Experience Report Results")
+        for key, value in crux_metrics.items():
+            st.write(f"**{key}:** {value}")
+        st.write("#### Lighthouse Results")
+        for key, value in lighthouse_metrics.items():
+            st.write(f"**{key}:** {value}")
+
+def render_crawlability(crawl_issues):
+    if crawl_issues:
+        for issue_code, issue_description, solution in crawl_issues:
+            st.write(f"**Issue ({issue_code}):** {issue_description}")
+            st.write(f"**Solution:** {solution}")
+            st.write("---")
+    else:
+        st.write("No crawlability issues detected.")
+
+def render_accessibility(access_issues):
+    if access_issues:
+        for issue_code, issue_description, solution in access_issues:
+            st.write(f"**Issue ({issue_code}):** {issue_description}")
+            st.write(f"**Solution:** {solution}")
+            st.write("---")
+    else:
+        st.write("No accessibility issues detected.")
+
+# (key, column, expander label, audit, renderer). Expanders are laid out in this order and
+# filled as their audits finish.
+PAGE_SECTIONS = [
+    ("title", 0, "🏷️ Title Tag Audit", TT, render_title),
+    ("meta", 0, "📝 Meta Description Audit", MD, render_meta),
+    ("h1", 0, "🔖 H1 Heading Audit", H1Audit, render_h1),
+    ("images", 0, "🖼️ Image Audit", ImageAudit, render_images),
+    ("linking", 1, "🔗 Linking Audit", LinkingAudit, render_linking),
+    ("anchors", 1, "⚓ Anchor Text Audit", AnchorTextAudit, render_anchors),
+    ("pagespeed", 1, "⚡ PageSpeed Insights", None, render_pagespeed),
+    ("crawlability", 1, "🕷️ Crawlability Insights", crawlability_insights, render_crawlability),
+    ("accessibility", 0, "♿ Accessibility Insights", accessibility_insights, render_accessibility),
+]
+
+def run_section_captured(audit, *args, **kwargs):
+    # Runs on a worker thread; log messages are collected and shown by the script thread.
+    section_log.messages = []
     try:
-        response = request_url(url)
-        if not response:
-            return ["Error fetching URL"], ["Failed to retrieve content for anchor text audit"]
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for element in soup.find_all(['header', 'nav', 'footer']):
-            element.extract()
-
-        main_content = soup.find('main') or soup.find('article') or soup.find('section') or soup
-        anchor_texts = [(a.get_text(strip=True), a['href']) for a in main_content.find_all('a', href=True) if a.get_text(strip=True)]
-        generic_texts = ["click here", "read more", "here", "link", "more"]
-
-        links_to_improve = []
-        recommended_anchor_texts = []
-
-        for text, href in anchor_texts:
-            if text.lower() in generic_texts:
-                links_to_improve.append(f"Link: {href} | Anchor Text: '{text}'")
-                gpt_suggestion = get_gpt_insights(f"Suggest a better anchor text for a link pointing to: {href}")
-                recommended_anchor_texts.append(gpt_suggestion)
-
-        while len(links_to_improve) < 3 and anchor_texts:
-            text, href = anchor_texts.pop(0)
-            links_to_improve.append(f"Link: {href} | Anchor Text: '{text}'")
-            gpt_suggestion = get_gpt_insights(f"Suggest a better anchor text for a link pointing to: {href}")
-            recommended_anchor_texts.append(gpt_suggestion)
-
-        if not links_to_improve:
-            return ["No Links to Improve Found"], ["All anchor texts on the page seem well-optimized."]
-
-        return links_to_improve, recommended_anchor_texts
-    except Exception as e:
-        return ["Unexpected error during anchor text audit"], [str(e)], []
-
-def get_pagespeed_insights(url):
-    API_ENDPOINT = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
-    API_KEY = st.secrets["pagespeed_api_key"]
-    
-    params = {
-        "url": url,
-        "key": API_KEY
-    }
-    
-    response = requests.get(API_ENDPOINT, params=params, headers=HEADERS)
-    data = response.json()
-    
-    return data
-
-def analyze_pagespeed_data(data):
-    crux_metrics = {}
-    lighthouse_metrics = {}
-
-    if 'loadingExperience' in data and 'metrics' in data['loadingExperience']:
-        metrics = data['loadingExperience']['metrics']
-        if 'FIRST_CONTENTFUL_PAINT_MS' in metrics:
-            crux_metrics['First Contentful Paint'] = metrics['FIRST_CONTENTFUL_PAINT_MS']['category']
-        if 'FIRST_INPUT_DELAY_MS' in metrics:
-            crux_metrics['First Input Delay'] = metrics['FIRST_INPUT_DELAY_MS']['category']
-
-    if 'lighthouseResult' in data and 'audits' in data['lighthouseResult']:
-        audits = data['lighthouseResult']['audits']
-        
-        lighthouse_keys = {
-            'First Contentful Paint': 'first-contentful-paint',
-            'Speed Index': 'speed-index',
-            'Time To Interactive': 'interactive',
-            'First Meaningful Paint': 'first-meaningful-paint',
-            'First CPU Idle': 'first-cpu-idle',
-            'Estimated Input Latency': 'estimated-input-latency'
-        }
-        
-        for display_key, audit_key in lighthouse_keys.items():
-            if audit_key in audits and 'displayValue' in audits[audit_key]:
-                lighthouse_metrics[display_key] = audits[audit_key]['displayValue']
-
-    return crux_metrics, lighthouse_metrics
-
-def crawlability_insights(url):
-    issues = []
-
-    def safe_request_url_inner(target_url):
-        try:
-            if not urlparse(target_url).scheme:
-                target_url = urljoin(url, target_url)
-            response = request_url(target_url)
-            return response
-        except requests.RequestException as e:
-            issues.append(("Error", f"Error fetching URL: {e}", "Ensure the URL is accessible and valid."))
-            return None
-
-    response = safe_request_url_inner(url)
-    if not response:
-        return issues
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    canonical_link = soup.find("link", rel="canonical")
-    if canonical_link and not safe_request_url_inner(canonical_link['href']):
-        issues.append(("CANON",
-                       f"This page has a broken canonical link pointing to {canonical_link['href']}.",
-                       "Ensure the canonical link points to a valid and accessible URL."))
-
-    css_files = [link['href'] for link in soup.find_all('link', rel='stylesheet') if link.get('href')]
-    js_files = [script['src'] for script in soup.find_all('script', src=True) if script.get('src')]
-    broken_js_css = [link for link in css_files if not safe_request_url_inner(link)] + [script for script in js_files if not safe_request_url_inner(script)]
-
-    if broken_js_css:
-        issues.append(("JSCSS", 
-                       f"Issues with broken internal JavaScript and CSS files: {', '.join(broken_js_css)}",
-                       "Ensure all linked JS and CSS files are accessible."))
-
-    num_files = len(css_files + js_files)
-    total_js_css_size = sum([len(safe_request_url_inner(link).text) for link in css_files + js_files if safe_request_url_inner(link)])
-    
-    if num_files > 10:
-        issues.append(("JSCSSFILES", 
-                       f"This page uses {num_files} JavaScript and CSS files, which is considered excessive.", 
-                       "Consider combining and minifying JS and CSS files to reduce the number of HTTP requests."))
-
-    if total_js_css_size > 1 * 1024 * 1024:
-        issues.append(("JSCSSSIZE", 
-                       f"The total size of JavaScript and CSS on this page is {total_js_css_size / (1024 * 1024):.2f}MB, which is considered too large.", 
-                       "Optimize and compress JS and CSS files to improve page load time."))
-
-    internal_links = [a['href'] for a in soup.find_all('a', href=True) if urlparse(url).netloc in urlparse(a['href']).netloc]
-    non_crawlable_links = [link for link in internal_links if not safe_request_url_inner(link)]
-    if non_crawlable_links:
-        issues.append(("LINKCRAWL",
-                       f"Links on this page couldn't be crawled (incorrect URL formats): {', '.join(non_crawlable_links)}",
-                       "Ensure all internal links on the page point to valid and accessible URLs."))
-
-    unminified_files = [link for link in css_files + js_files if ".min." not in link]
-    if unminified_files:
-        issues.append(("MINIFY",
-                       f"Issues with unminified JavaScript and CSS files: {', '.join(unminified_files)}",
-                       "Minify the JS and CSS files to improve page load time."))
-
-    return issues
-
-def accessibility_insights(url):
-    issues = []
-    visited_urls = set()
-
-    response = safe_request_url(url, method='HEAD')
-    
-    if not response:
-        issues.append(("URLRES", "URL does not resolve.", "Ensure the URL is correct and the server is responsive."))
-        return issues
-
-    if len(response.history) > 1:
-        for r in response.history:
-            if r.url in visited_urls:
-                issues.append(("REDIRCHAIN", "Redirect chains and loops detected on this page.", f"The URL {r.url} was redirected to multiple times. Ensure redirects are set up correctly to avoid loops."))
-                break
-            visited_urls.add(r.url)
-
-    if response.history:
-        last_redirect = response.history[-1]
-        if last_redirect.status_code == 301:
-            issues.append(("PERMREDIR", "This URL has a permanent redirect.", f"The URL redirects permanently (301) to {response.url}. Ensure this is intended and update references to the original URL if necessary."))
+        return audit(*args, **kwargs), section_log.messages
+    finally:
+        section_log.messages = None
+
+def page_audits(pagespeed_api_key, use_cache=True):
+    # Job audits for PAGE_SECTIONS. PageSpeed only needs the URL, so it starts before the page is fetched.
+    # An explicit re-run passes use_cache=False so PageSpeed measures the page again instead of returning its cached report.
+    audits = []
+    for key, _, _, audit, _ in PAGE_SECTIONS:
+        if audit is None:
+            audits.append((key, functools.partial(run_section_captured, get_pagespeed_reports, api_key=pagespeed_api_key,
+                                                  use_cache=use_cache), False))
         else:
-            issues.append(("TEMPREDIR", "This URL has a temporary redirect.", f"The URL redirects temporarily ({last_redirect.status_code}) to {response.url}. Ensure this is intended, as temporary redirects might not pass link equity in the same way permanent redirects do."))
-
-    if any(issue[0] in ["TEMPREDIR", "PERMREDIR", "REDIRCHAIN"] for issue in issues):
-        issues.append(("REDIR", "This URL has a redirect issue.", "Review the specific redirect issues listed above and rectify as necessary."))
-
-    return issues
+            audits.append((key, functools.partial(run_section_captured, audit), True))
+    return audits
+
+# Rows listed per crawl report section; the counts in the headings cover every page.
+REPORT_LIMIT = 500
+
+# Jobs per session, on top of the shared store, so a session can still reach its own results after eviction.
+SESSION_MAX_JOBS = 10
+
+@st.cache_resource
+def get_job_store():
+    # One store per server process, shared by every session and surviving reruns and page reloads.
+    return JobStore()
+
+def find_job(key, factory, restart=False):
+    session_jobs = st.session_state.setdefault("audit_jobs", {})
+    session_job = None if restart else session_jobs.pop(key, None)
+    # A job the shared store has already evicted is put back rather than started again.
+    job = get_job_store().get_or_start(key, lambda: session_job or factory(), restart=restart)
+    session_jobs[key] = job
+    while len(session_jobs) > SESSION_MAX_JOBS:
+        session_jobs.pop(next(iter(session_jobs)))
+    return job
 
 st.title("Single Page SEO Auditor")
 url = st.text_input("Enter URL of the page to audit")
+crawl_mode = st.checkbox("Crawl the site starting from this URL")
+if crawl_mode:
+    crawl_col1, crawl_col2 = st.columns(2)
+    max_pages = crawl_col1.number_input("Maximum pages", min_value=1, max_value=100000, value=100)
+    max_depth = crawl_col2.number_input("Maximum link depth", min_value=0, max_value=50, value=3)
+    use_sitemaps = st.checkbox("Seed the crawl from the site's sitemaps")
+
+# The tracer is shared by every session. A session holds one enable() under its session id while its
+# box is ticked, so it never turns off a trace another session is recording. Sessions that were closed
+# or reloaded with the box ticked never untick it, so their hold is dropped once they are gone.
+if runtime.exists():
+    tracer.prune(runtime.get_instance().is_active_session)
+record_trace = st.sidebar.checkbox("Record performance trace", key="record_trace")
+if record_trace != st.session_state.get("trace_enabled", False):
+    session_id = get_script_run_ctx().session_id
+    if record_trace:
+        tracer.enable(session_id)
+    else:
+        tracer.disable(session_id)
+    st.session_state["trace_enabled"] = record_trace
+trace_mark = tracer.mark()
+
+if url and crawl_mode:
+    rerun_crawl = st.button("🔄 Re-run crawl")
+    crawl_key = JobStore.make_key(url, mode="crawl", max_pages=int(max_pages), max_depth=int(max_depth), sitemap=use_sitemaps)
+    job = find_job(crawl_key, lambda: CrawlJob(url, int(max_pages), int(max_depth), sitemap=use_sitemaps), restart=rerun_crawl)
+    trace_mark = job.trace_mark
+    progress = st.progress(0)
+    status = st.empty()
+
+    # The crawl runs in the background; this loop only reports on it, so a rerun can interrupt it safely.
+    with st.spinner("Crawling..."):
+        while not job.wait(0.5):
+            progress.progress(min(job.pages_crawled / job.max_pages, 1.0))
+            status.text(f"Crawled {job.pages_crawled} pages: {job.last_url or url}")
+    progress.progress(1.0)
+    status.text(f"Crawl complete! {job.pages_crawled} pages crawled.")
+    if job.error:
+        st.error(f"The crawl stopped early: {job.error}")
+
+    # Findings live in the job's result store; each expander queries it for at most REPORT_LIMIT rows.
+    store = job.store
+    code_counts = store.code_counts()
+    page_sections = [
+        ("🏷️ Pages Missing a Title Tag", NO_TITLE),
+        ("📝 Pages Missing a Meta Description", NO_META),
+        ("🔖 Pages Missing an H1", NO_H1),
+        ("🔖 Pages With Multiple H1s", MULTIPLE_H1),
+    ]
+    for label, code in page_sections:
+        with st.expander(f"{label} ({code_counts.get(code, 0)})"):
+            for page_url in store.pages_with(code, limit=REPORT_LIMIT):
+                st.write(page_url)
+
+    with st.expander(f"🔗 Broken Link Targets ({store.target_count()})"):
+        for target, source_count in store.targets(limit=REPORT_LIMIT):
+            st.write(f"**{target}** is linked from {source_count} page(s):")
+            st.write(", ".join(store.sources(target, limit=20)))
+            st.write("---")
+
+    crawl_issue_counts = store.code_counts(section="crawlability")
+    with st.expander(f"🕷️ Crawlability Issues ({len(crawl_issue_counts)})"):
+        for issue_code, page_count in crawl_issue_counts.items():
+            st.write(f"**Issue ({issue_code}):** {page_count} page(s)")
+            st.write(", ".join(store.pages_with(issue_code, limit=20)))
+            st.write("---")
+
+    reader = job.sitemap_reader
+    if reader is not None:
+        entry_problems = store.entry_problems(SITEMAP_ISSUE_CODES, limit=REPORT_LIMIT)
+        with st.expander(f"🗺️ Sitemap URLs That Redirect or Are Broken ({len(entry_problems)})"):
+            st.write(f"Read {len(reader.sitemaps_read)} sitemap(s) listing {reader.urls_listed} URLs "
+                     f"({reader.duplicates} duplicates, {reader.filtered} filtered out).")
+            for sitemap_url, error in reader.errors:
+                st.warning(f"Could not read {sitemap_url}: {error}")
+            st.write("Sitemaps should list the final URL of each page, and only pages that work.")
+            for page_url, status_code, error, codes in entry_problems:
+                st.write(f"{page_url}: {error or ', '.join(codes) or f'HTTP {status_code}'}")
+
+    duplicate_clusters = job.duplicate_clusters or []
+    duplicate_sections = [
+        ("title", "🏷️ Duplicate Titles"),
+        ("meta_description", "📝 Duplicate Meta Descriptions"),
+        ("content", "📄 Duplicate and Near-Duplicate Content"),
+    ]
+    for field, label in duplicate_sections:
+        clusters = [cluster for cluster in duplicate_clusters if cluster.field == field]
+        with st.expander(f"{label} ({len(clusters)} groups)"):
+            for cluster in clusters[:50]:
+                kind = "Identical" if cluster.kind == "exact" else f"Near-identical (~{cluster.similarity:.0%} similar)"
+                st.write(f"**{kind}:** {len(cluster.urls)} pages")
+                st.write(", ".join(cluster.urls[:20]))
+                st.write("---")
 
-if url:
+    graph_metrics = job.graph_metrics
+    if graph_metrics is not None:
+        orphans = graph_metrics.orphans()
+        with st.expander(f"🏝️ Orphan Pages ({len(orphans)})"):
+            st.write("No other crawled page links to these pages.")
+            for page_url in orphans:
+                st.write(page_url)
+
+        deep_pages = graph_metrics.deep_pages()
+        with st.expander(f"🪜 Pages Four or More Clicks From the Start Page ({len(deep_pages)})"):
+            for page_url, depth in sorted(deep_pages, key=lambda item: -item[1]):
+                st.write(f"{page_url} ({depth} clicks)")
+
+        nav_only = graph_metrics.nav_only()
+        with st.expander(f"🧭 Pages Linked Only From Navigation ({len(nav_only)})"):
+            st.write("Every internal link to these pages sits in the header, nav or footer. Consider linking them from page content.")
+            for page_url in nav_only:
+                st.write(page_url)
+
+        with st.expander("🏆 Internal Link Equity (PageRank)"):
+            for page_url, score in graph_metrics.top_pagerank():
+                page_stats = graph_metrics.page(page_url)
+                st.write(f"{page_url}: {score * 100:.2f}% ({page_stats['in_degree']} inlinks, depth {page_stats['depth']})")
+
+    with st.expander(f"❌ Pages That Could Not Be Audited ({store.failed_page_count()})"):
+        for page_url, error in store.failed_pages(limit=REPORT_LIMIT):
+            st.write(f"{page_url}: {error}")
+
+elif url:
+    rerun_all = st.button("🔄 Re-run all audits")
+    pagespeed_api_key = st.secrets["pagespeed_api_key"]
+    job = find_job(JobStore.make_key(url, mode="page"),
+                   lambda: AuditJob(url, page_audits(pagespeed_api_key, use_cache=not rerun_all)), restart=rerun_all)
     progress = st.progress(0)
-    progress_step = 1.0 / 9
     status = st.empty()
+    col1, col2 = st.columns(2)
+    columns = (col1, col2)
+    expanders = {key: columns[column].expander(label) for key, column, label, _, _ in PAGE_SECTIONS}
+    rerun_sections = [key for key, expander in expanders.items() if expander.button("🔄 Re-run section", key=f"rerun-{key}")]
+    bodies = {key: expander.empty() for key, expander in expanders.items()}
+    if rerun_sections:
+        job.run(rerun_sections, page_audits(pagespeed_api_key, use_cache=False))
+    trace_mark = job.trace_mark
+
+    # Results already in the job render straight away; the rest fill in as they finish.
+    futures, page_future = job.snapshot()
+    for key, future in futures.items():
+        if not future.done():
+            bodies[key].caption("Running...")
+
+    # Page fetch plus one unit per section.
+    total_steps = len(futures) + 1
+    completed_steps = 0
 
     with st.spinner("Analyzing..."):
-        col1, col2 = st.columns(2)
-
-        status.text("Analyzing Title Tag...")
-        with col1.expander("🏷️ Title Tag Audit"):
-            title, title_insights = TT(url)
-            st.write(f"**Title Tag Content:** {title}")
-            if title_insights:
-                st.write(f"**Recommendations:** {title_insights}")
-        progress.progress(progress_step)
-
-        status.text("Analyzing Meta Description...")
-        with col1.expander("📝 Meta Description Audit"):
-            meta_desc, meta_desc_insights = MD(url)
-            if meta_desc:
-                st.write(f"**Meta Description Content:** {meta_desc}")
-                if meta_desc_insights:
-                    st.write(f"**Recommendations:** {meta_desc_insights}")
-            else:
-                st.write(meta_desc_insights)
-        progress.progress(2 * progress_step)
-
-        status.text("Auditing H1 Headings...")
-        with col1.expander("🔖 H1 Heading Audit"):
-            optimization, details, recommendations = H1Audit(url)
-            st.write(f"**Optimization:** {optimization}")
-            st.write(f"**Details:** {details}")
-            st.write(f"**Recommendations:** {recommendations}")
-        progress.progress(3 * progress_step)
-
-        status.text("Auditing Images...")
-        with col1.expander("🖼️ Image Audit"):
-            image_audit_results = ImageAudit(url)
-            for key, value in image_audit_results.items():
-                st.write(f"**{value[1]}**")
-                if isinstance(value[2], list):
-                    for img, suggestion in value[2]:
-                        st.write(f"Image: {img}")
-                        st.write(f"Suggestion: {suggestion}")
-                else:
-                    st.write(value[2])
-                st.write("---")
-        progress.progress(4 * progress_step)
-
-        status.text("Analyzing Linking...")
-        with col2.expander("🔗 Linking Audit"):
-            linking_issues = LinkingAudit(url)
-            if linking_issues:
-                for issue_data in linking_issues:
-                    st.write("**Issue:**", issue_data["issue"])
-                    st.write("**Solution:**", issue_data["solution"])
-                    st.write("---")
-            else:
-                st.write("No internal linking issues found.")
-        progress.progress(5 * progress_step)
-
-        status.text("Analyzing Anchor Texts...")
-        with col2.expander("⚓ Anchor Text Audit"):
-            issues, solutions = AnchorTextAudit(url)
-            if issues:
-                for issue, solution in zip(issues, solutions):
-                    st.write("**Issue:**", issue)
-                    st.write("**Solution:**", solution)
-                    st.write("---")
-            else:
-                st.write("No anchor text issues found.")
-        progress.progress(6 * progress_step)
-
-        status.text("Fetching PageSpeed Insights...")
-        with col2.expander("⚡ PageSpeed Insights"):
-            pagespeed_data = get_pagespeed_insights(url)
-            crux_metrics, lighthouse_metrics = analyze_pagespeed_data(pagespeed_data)
-            st.write("## Chrome User Experience Report Results")
-            for key, value in crux_metrics.items():
-                st.write(f"**{key}:** {value}")
-            st.write("## Lighthouse Results")
-            for key, value in lighthouse_metrics.items():
-                st.write(f"**{key}:** {value}")
-        progress.progress(7 * progress_step)
-
-        status.text("Analyzing Crawlability...")
-        with col2.expander("🕷️ Crawlability Insights"):
-            crawl_issues = crawlability_insights(url)
-            if crawl_issues:
-                for issue_code, issue_description, solution in crawl_issues:
-                    st.write(f"**Issue ({issue_code}):** {issue_description}")
-                    st.write(f"**Solution:** {solution}")
-                    st.write("---")
-            else:
-                st.write("No crawlability issues detected.")
-        progress.progress(8 * progress_step)
-
-        status.text("Checking Accessibility...")
-        with col1.expander("♿ Accessibility Insights"):
-            access_issues = accessibility_insights(url)
-            if access_issues:
-                for issue_code, issue_description, solution in access_issues:
-                    st.write(f"**Issue ({issue_code}):** {issue_description}")
-                    st.write(f"**Solution:** {solution}")
-                    st.write("---")
-            else:
-                st.write("No accessibility issues detected.")
-        progress.progress(1.0)
+        status.text("Fetching page...")
+        if page_future is not None:
+            wait([page_future])
+        completed_steps += 1
+        progress.progress(completed_steps / total_steps)
+
+        renderers = {key: render for key, _, _, _, render in PAGE_SECTIONS}
+        labels = {key: label for key, _, label, _, _ in PAGE_SECTIONS}
+        sections_by_future = {future: key for key, future in futures.items()}
+        running = set(futures)
+        status.text(f"Running {len(running)} audits...")
+        for future in as_completed(sections_by_future):
+            key = sections_by_future[future]
+            running.discard(key)
+            with bodies[key].container():
+                try:
+                    result, messages = future.result()
+                    for levelno, message in messages:
+                        show_log_message(levelno, message)
+                    renderers[key](result)
+                except Exception as e:
+                    st.error(f"This audit failed: {e}")
+            completed_steps += 1
+            progress.progress(completed_steps / total_steps)
+            if running:
+                status.text("Waiting for: " + ", ".join(labels[key].split(" ", 1)[1] for key in running))
 
     status.text("Analysis Complete!")
 
 st.markdown("----")
 
+if record_trace and url:
+    trace_records = tracer.records(since=trace_mark)
+    trace_summary = summarize(trace_records)
+    with st.sidebar.expander("⏱️ Performance trace"):
+        st.caption("Audits other sessions run at the same time are recorded too.")
+        st.write(f"HTTP: {trace_summary['http_requests']} requests, {trace_summary['http_bytes'] / 1024:.0f} KB, "
+                 f"{trace_summary['http_seconds']:.1f}s total")
+        st.write(f"LLM: {trace_summary['llm_calls']} calls, {trace_summary['llm_prompt_tokens']} prompt + "
+                 f"{trace_summary['llm_completion_tokens']} completion tokens, {trace_summary['llm_seconds']:.1f}s total, "
+                 f"{trace_summary['llm_skipped']} skipped by the pre-filter or token budget")
+        st.write("**Slowest operations:**")
+        for record in slowest_spans(trace_records):
+            name = record.get("name") or f"{record.get('method', record['type'].upper())} {record.get('url', record.get('model', ''))}"
+            st.write(f"{record['duration']:.2f}s - {name}")
+    st.sidebar.download_button("Download trace (JSON lines)", to_json_lines(trace_records), file_name="seoauditor-trace.jsonl")
+    st.sidebar.download_button("Download metrics (Prometheus)", to_prometheus(trace_records), file_name="seoauditor-metrics.prom")
+
+cache_stats = gpt_cache.stats()
+st.sidebar.caption(f"GPT cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries")
+
 st.sidebar.markdown(
     "#### [Made by Jonathan Boshoff](https://jonathanboshoff.com/one-page-seo-audit/)"
 )
@@ -0,0 +1,160 @@
+"""Offline benchmark for every audit against a local fixture site, fake OpenAI and fake PageSpeed.
+
+    python benchmarks/audit_benchmark.py                  # run and print the metrics
+    python benchmarks/audit_benchmark.py --save-baseline  # also write the baseline file
+    python benchmarks/audit_benchmark.py --compare        # exit 1 if a metric regresses past --threshold
+
+For each audit it records wall time, HTTP requests and bytes served by the fixture and PageSpeed
+servers, LLM calls and peak traced memory. Every audit starts from a fresh page fetch and empty caches.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+METRICS = ("wall_time", "http_requests", "http_bytes", "llm_calls", "peak_memory_kb")
+# Absolute slack per metric so tiny numbers don't trip the relative threshold on noise.
+SLACK = {"wall_time": 0.05, "http_requests": 0, "http_bytes": 1024, "llm_calls": 0, "peak_memory_kb": 256}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's metrics to the baseline file.")
+    parser.add_argument("--compare", action="store_true", help="Compare against the baseline and fail on regressions.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression per metric (default 0.25).")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--links", type=int, default=300)
+    parser.add_argument("--slow-latency", type=float, default=0.2, help="Seconds the fixture's slow endpoints take.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per fake OpenAI response.")
+    parser.add_argument("--pagespeed-latency", type=float, default=1.0, help="Seconds per fake PageSpeed response.")
+    parser.add_argument("--output", help="Also write the metrics as JSON to this path.")
+    return parser.parse_args(argv)
+
+def fresh_caches(cache_dir, run):
+    # Point both persistent caches at empty files so every audit pays its full cost.
+    from seoauditor import llm, pagespeed
+    from seoauditor.cache import DiskCache
+
+    llm.gpt_cache = DiskCache(os.path.join(cache_dir, f"llm-{run}.sqlite3"), ttl=llm.LLM_CACHE_TTL, max_bytes=llm.LLM_CACHE_MAX_BYTES)
+    pagespeed.pagespeed_cache = DiskCache(os.path.join(cache_dir, f"pagespeed-{run}.sqlite3"),
+                                          ttl=pagespeed.PAGESPEED_CACHE_TTL, max_bytes=pagespeed.PAGESPEED_CACHE_MAX_BYTES)
+
+def run_benchmark(args, cache_dir):
+    import openai
+
+    import seoauditor
+    from seoauditor import pagespeed
+    from fixture_site import start_fixture_servers
+
+    site, llm_server, pagespeed_server = start_fixture_servers(args.slow_latency, args.llm_latency, args.pagespeed_latency,
+                                                               args.images, args.links)
+    openai.api_key = "benchmark"
+    openai.api_base = f"{llm_server.base_url}/v1"
+    pagespeed.PAGESPEED_API_ENDPOINT = f"{pagespeed_server.base_url}/runPagespeed"
+    start_url = f"{site.base_url}/start"
+
+    audits = [
+        ("fetch_page", lambda page: seoauditor.fetch_page(start_url)),
+        ("TT", seoauditor.TT),
+        ("MD", seoauditor.MD),
+        ("H1Audit", seoauditor.H1Audit),
+        ("ImageAudit", seoauditor.ImageAudit),
+        ("LinkingAudit", seoauditor.LinkingAudit),
+        ("AnchorTextAudit", seoauditor.AnchorTextAudit),
+        ("get_pagespeed_reports", lambda page: seoauditor.get_pagespeed_reports(start_url, api_key="benchmark")),
+        ("crawlability_insights", seoauditor.crawlability_insights),
+        ("accessibility_insights", seoauditor.accessibility_insights),
+    ]
+
+    results = {}
+    try:
+        for run, (name, audit) in enumerate(audits):
+            fresh_caches(cache_dir, run)
+            page = seoauditor.fetch_page(start_url)
+            for server in (site, llm_server, pagespeed_server):
+                server.traffic.reset()
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            audit(page)
+            wall_time = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                "wall_time": round(wall_time, 3),
+                "http_requests": site.traffic.requests + pagespeed_server.traffic.requests,
+                "http_bytes": site.traffic.bytes + pagespeed_server.traffic.bytes,
+                "llm_calls": llm_server.traffic.requests,
+                "peak_memory_kb": round(peak / 1024),
+            }
+    finally:
+        for server in (site, llm_server, pagespeed_server):
+            server.stop()
+    return results
+
+def find_regressions(results, baseline, threshold):
+    regressions = []
+    for name, metrics in results.items():
+        for metric in METRICS:
+            if name not in baseline or metric not in baseline[name]:
+                continue
+            before, after = baseline[name][metric], metrics[metric]
+            if after - before > SLACK[metric] and after > before * (1 + threshold):
+                regressions.append(f"{name}.{metric}: {before} -> {after}")
+    return regressions
+
+def print_table(results, baseline=None):
+    print(f"{'audit':<24}" + "".join(f"{metric:>16}" for metric in METRICS))
+    for name, metrics in results.items():
+        cells = []
+        for metric in METRICS:
+            cell = str(metrics[metric])
+            if baseline and name in baseline and metric in baseline[name]:
+                cell += f" ({baseline[name][metric]})"
+            cells.append(f"{cell:>16}")
+        print(f"{name:<24}" + "".join(cells))
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # The caches are opened at import time, so their paths must be set before seoauditor loads.
+        os.environ["SEOAUDITOR_LLM_CACHE"] = os.path.join(cache_dir, "llm.sqlite3")
+        os.environ["SEOAUDITOR_PAGESPEED_CACHE"] = os.path.join(cache_dir, "pagespeed.sqlite3")
+        results = run_benchmark(args, cache_dir)
+
+    baseline = None
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions beyond the threshold:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions beyond the threshold.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Compare the single-pass page-facts extractor with the BeautifulSoup path the audits used.
+
+    python benchmarks/extract_benchmark.py [--sizes 1,2,5] [--repeat 3]
+
+Builds synthetic CMS-style pages of the given sizes (MB), checks both paths extract the same
+facts, and prints the best-of-N time for each.
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seoauditor.extract import extract_page_facts  # noqa: E402
+
+def build_page(target_bytes, seed=0):
+    rng = random.Random(seed)
+    words = ["seo", "audit", "product", "guide", "pricing", "blog", "support", "read", "more", "click", "here"]
+    nav = "".join(f'<li><a href="/nav/{i}">Nav {i}</a></li>' for i in range(40))
+    head = ('<!DOCTYPE html><html><head><title>Synthetic benchmark page for the extractor</title>'
+            '<meta name="description" content="A synthetic page used to benchmark page fact extraction.">'
+            '<link rel="canonical" href="/canonical">'
+            + "".join(f'<link rel="stylesheet" href="/static/style-{i}.css">' for i in range(8))
+            + "".join(f'<script src="/static/app-{i}.js"></script>' for i in range(8))
+            + '<style>body { color: #333; }</style></head><body>'
+            f'<header><nav><ul>{nav}</ul></nav><h1>Site name</h1></header><main>')
+    blocks = []
+    size = len(head)
+    i = 0
+    while size < target_bytes:
+        text = " ".join(rng.choice(words) for _ in range(60))
+        block = (f'<section class="block-{i}"><h2>Heading {i}</h2><p>{text} '
+                 f'<a href="/page/{i}?ref=body">{rng.choice(words)} {rng.choice(words)}</a> &amp; '
+                 f'<a href="https://external.example/{i}">external</a></p>'
+                 f'<img src="/images/product-{i}-photo.jpg" alt="{rng.choice(words)} photo">'
+                 f'<img src="/images/img{i}.png"><script>var x{i} = "<a href=\'/fake\'>";</script></section>')
+        blocks.append(block)
+        size += len(block)
+        i += 1
+    tail = '</main><footer><a href="/privacy">Privacy</a></footer></body></html>'
+    return head + "".join(blocks) + tail
+
+def soup_facts(html):
+    # The lookups the audits made before the extractor, on one shared tree.
+    soup = BeautifulSoup(html, 'html.parser')
+    meta = soup.find('meta', attrs={'name': 'description'})
+    canonical = soup.find("link", rel="canonical")
+    main = copy.copy(soup)
+    for element in main.find_all(['header', 'nav', 'footer']):
+        element.extract()
+    main = main.find('main') or main.find('article') or main.find('section') or main
+    return {
+        "title": soup.title.string if soup.title else None,
+        "meta_description": meta['content'] if meta else None,
+        "canonical": canonical['href'] if canonical else None,
+        "stylesheets": [link['href'] for link in soup.find_all('link', rel='stylesheet') if link.get('href')],
+        "scripts": [script['src'] for script in soup.find_all('script', src=True) if script.get('src')],
+        "h1s": [h1.get_text(strip=True) for h1 in soup.find_all('h1')],
+        "images": [(img['src'], img.get('alt')) for img in soup.find_all('img') if img.get('src')],
+        "links": [a['href'] for a in soup.find_all('a', href=True)],
+        "main_links": [(a.get_text(strip=True), a['href']) for a in main.find_all('a', href=True)],
+    }
+
+def extractor_facts(html):
+    facts = extract_page_facts(html)
+    return {
+        "title": facts.title,
+        "meta_description": facts.meta_description,
+        "canonical": facts.canonical,
+        "stylesheets": facts.stylesheets,
+        "scripts": facts.scripts,
+        "h1s": facts.h1s,
+        "images": [(img.src, img.alt) for img in facts.images],
+        "links": [link.href for link in facts.links],
+        "main_links": [(link.text, link.href) for link in facts.main_content_links],
+    }
+
+def best_time(func, html, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,2,5", help="Comma-separated page sizes in MB.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>8} {'soup (s)':>10} {'extract (s)':>12} {'speedup':>8}")
+    for size_mb in (float(size) for size in args.sizes.split(",")):
+        html = build_page(int(size_mb * 1024 * 1024))
+        expected, actual = soup_facts(html), extractor_facts(html)
+        mismatched = [key for key in expected if expected[key] != actual[key]]
+        if mismatched:
+            sys.exit(f"Extractor disagrees with BeautifulSoup on: {', '.join(mismatched)}")
+        soup_time = best_time(soup_facts, html, args.repeat)
+        extract_time = best_time(extract_page_facts, html, args.repeat)
+        print(f"{size_mb:>6.1f}MB {soup_time:>10.3f} {extract_time:>12.3f} {soup_time / extract_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Local stand-ins for a client site, the OpenAI chat API and the PageSpeed API.
+
+Every server counts the requests it answers and the body bytes it sends, so the benchmark can
+report HTTP traffic without instrumenting the client.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class TrafficCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes = 0
+
+    def add(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.traffic = TrafficCounter()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def handle_error(self, request, client_address):
+        # Ranged probes hang up once they have the bytes they need; that is expected, not an error.
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None, ranges=False):
+        # With ranges, a "Range: bytes=a-b" request gets that slice as a 206, like a static file server.
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", "")) if ranges and status == 200 else None
+        if match and int(match.group(1)) < len(body):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+            headers = dict(headers or {}, **{"Content-Range": f"bytes {start}-{end}/{len(body)}"})
+            status, body = 206, body[start:end + 1]
+        send_body = self.command != "HEAD"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+        self.server.traffic.add(len(body) if send_body else 0)
+
+def build_fixture_page(images=200, links=300, assets=12):
+    # A product-style page: many images and links, some broken or slow, plus JS/CSS assets.
+    image_tags = []
+    for i in range(images):
+        src = f"/images/missing-{i}.jpg" if i % 25 == 0 else (f"/images/product-photo-{i}.jpg" if i % 2 else f"/images/IMG{i}.png")
+        alt = "" if i % 3 == 0 else (f"product photo {i}" if i % 3 == 1 else "logo")
+        image_tags.append(f'<img src="{src}" alt="{alt}">')
+    link_tags = []
+    for i in range(links):
+        if i % 30 == 0:
+            href = f"/broken/{i}"
+        elif i % 50 == 1:
+            href = f"/slow/{i}"
+        else:
+            href = f"/articles/{i % 120}"
+        text = "click here" if i % 40 == 0 else f"Article {i}"
+        link_tags.append(f'<a href="{href}">{text}</a>')
+    css = "".join(f'<link rel="stylesheet" href="/static/style-{i}.css">' for i in range(assets // 2))
+    js = "".join(f'<script src="/static/{"missing" if i == 0 else "app"}-{i}.js"></script>' for i in range(assets // 2))
+    return ("<!DOCTYPE html><html><head><title>Fixture product page</title>"
+            '<meta name="description" content="A fixture page for benchmarking the audits.">'
+            f'<link rel="canonical" href="/page">{css}{js}</head><body>'
+            '<header><nav><a href="/">Home</a><a href="/about">About</a></nav></header>'
+            f"<main><h1>Fixture product</h1><h1>Second heading</h1>{''.join(image_tags)}"
+            f"<p>{''.join(link_tags)}</p></main><footer><a href=\"/privacy\">Privacy</a></footer></body></html>")
+
+def make_site_handler(page_html, slow_latency):
+    class SiteHandler(QuietHandler):
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/start":
+                self.send_body(301, "", "text/html", {"Location": "/hop"})
+            elif path == "/hop":
+                self.send_body(302, "", "text/html", {"Location": "/page"})
+            elif path == "/page":
+                self.send_body(200, page_html, "text/html; charset=utf-8")
+            elif path.startswith("/broken") or "missing" in path:
+                self.send_body(404, "Not found", "text/plain")
+            elif path.startswith("/slow"):
+                time.sleep(slow_latency)
+                self.send_body(200, "<html><title>Slow</title></html>", "text/html")
+            elif path.startswith("/images/"):
+                self.send_body(200, b"\x89PNG\r\n\x1a\n" + b"\0" * 20000, "image/png", ranges=True)
+            elif path.startswith("/static/"):
+                self.send_body(200, "/* asset */" + "x" * 150000, "text/css" if path.endswith(".css") else "application/javascript",
+                               ranges=True)
+            else:
+                self.send_body(200, f"<html><head><title>{path}</title></head><body><h1>{path}</h1></body></html>", "text/html")
+    return SiteHandler
+
+class OpenAIHandler(QuietHandler):
+    # Answers /v1/chat/completions; JSON-mode requests get one answer per request id.
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = request["messages"][-1]["content"]
+        if request.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps({key: f"Suggestion for: {value[-40:]}" for key, value in json.loads(prompt).items()})
+        else:
+            content = f"Suggestion for: {prompt[-40:]}"
+        body = {
+            "id": "chatcmpl-fixture",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
+        self.send_body(200, json.dumps(body), "application/json")
+
+class PageSpeedHandler(QuietHandler):
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        strategy = parse_qs(urlparse(self.path).query).get("strategy", ["mobile"])[0]
+        body = {
+            "loadingExperience": {"metrics": {"FIRST_CONTENTFUL_PAINT_MS": {"category": "FAST"},
+                                              "FIRST_INPUT_DELAY_MS": {"category": "AVERAGE"}}},
+            "lighthouseResult": {"audits": {"first-contentful-paint": {"displayValue": "1.2 s"},
+                                            "speed-index": {"displayValue": "2.4 s" if strategy == "mobile" else "1.1 s"},
+                                            "interactive": {"displayValue": "3.0 s"}}},
+        }
+        self.send_body(200, json.dumps(body), "application/json")
+
+def start_fixture_servers(slow_latency=0.2, llm_latency=0.3, pagespeed_latency=1.0, images=200, links=300):
+    site = CountingServer(make_site_handler(build_fixture_page(images, links), slow_latency)).start()
+    llm = CountingServer(OpenAIHandler, latency=llm_latency).start()
+    pagespeed = CountingServer(PageSpeedHandler, latency=pagespeed_latency).start()
+    return site, llm, pagespeed
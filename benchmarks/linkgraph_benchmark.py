@@ -0,0 +1,51 @@
+"""Time building and analyzing a large synthetic internal link graph.
+
+    python benchmarks/linkgraph_benchmark.py [--pages 100000] [--links 8]
+
+Every page links to a shared set of nav pages from its header plus --links random content links,
+so the default is about a million edges. Peak memory is traced during analysis only, since
+tracemalloc slows the Python-level graph building several times over.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seoauditor.linkgraph import LinkGraph  # noqa: E402
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--links", type=int, default=8, help="Random content links per page.")
+    parser.add_argument("--nav", type=int, default=2, help="Nav links on every page.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(0)
+    urls = [f"https://example.com/page/{i}" for i in range(args.pages)]
+    nav = [(urls[i], True) for i in range(args.nav)]
+
+    start = time.perf_counter()
+    graph = LinkGraph(urls[0])
+    for url in urls:
+        graph.add_page(url, nav + [(urls[rng.randrange(args.pages)], False) for _ in range(args.links)])
+    built = time.perf_counter()
+    tracemalloc.start()
+    metrics = graph.analyze()
+    analyzed = time.perf_counter()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"pages: {len(graph.urls)}  edges: {graph.edge_count}")
+    print(f"build:   {built - start:.2f}s")
+    print(f"analyze: {analyzed - built:.2f}s")
+    print(f"analyze peak traced memory: {peak / (1024 * 1024):.0f} MB")
+    print(f"orphans: {len(metrics.orphans())}  nav-only: {len(metrics.nav_only())}  max depth: {int(metrics.depth.max())}")
+
+if __name__ == "__main__":
+    main()
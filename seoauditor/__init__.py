@@ -0,0 +1,30 @@
+from .audits import (
+    AUDIT_SECTIONS,
+    MD,
+    TT,
+    AnchorTextAudit,
+    H1Audit,
+    ImageAudit,
+    LinkingAudit,
+    accessibility_insights,
+    crawlability_insights,
+    run_audit,
+    run_section,
+)
+from .crawl import CrawlFrontier, CrawlPageResult, crawl_site
+from .duplicates import DuplicateCluster, DuplicateDetector
+from .fetch import PageSnapshot, URLChecker, fetch_page
+from .history import AuditHistory, run_incremental_audit
+from .jobs import AuditJob, CrawlJob, JobStore
+from .linkgraph import LinkGraph
+from .llm import configure_llm, get_gpt_insights, get_gpt_insights_batch, gpt_cache
+from .pagespeed import (
+    analyze_pagespeed_data,
+    configure_pagespeed,
+    get_pagespeed_insights,
+    get_pagespeed_reports,
+    pagespeed_cache,
+    start_pagespeed_reports,
+)
+from .results import Finding, PageRecord, ResultStore, open_run, stored_crawl
+from .sitemaps import SitemapEntry, SitemapReader, discover_sitemaps
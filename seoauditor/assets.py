@@ -0,0 +1,146 @@
+import struct
+import zlib
+from collections import namedtuple
+
+from .politeness import THROTTLE_STATUSES
+
+# What an asset's response headers and first few KB reveal without downloading the rest: the bytes
+# it costs on the wire, its encoding, image format and pixel size, and whether a script or
+# stylesheet looks minified.
+
+# Enough of a script or stylesheet to judge minification.
+ASSET_PROBE_BYTES = 8 * 1024
+# PNG, GIF and WebP keep their size in the first 30 bytes; JPEG dimensions come after any EXIF/ICC
+# segments, so a JPEG whose frame header is not in the first read gets a second one up to the max.
+IMAGE_PROBE_BYTES = 2 * 1024
+IMAGE_HEADER_MAX_BYTES = 128 * 1024
+COMPRESSED_ENCODINGS = ('gzip', 'br', 'deflate', 'zstd')
+# Text assets smaller than this gain little from compression or minification.
+TEXT_ASSET_MIN_BYTES = 1024
+# Minified code has long lines; source code averages well under 100 characters per line.
+MINIFIED_LINE_LENGTH = 200
+OVERSIZED_IMAGE_BYTES = 200 * 1024
+OVERSIZED_IMAGE_PIXELS = 2560
+# Intrinsic width beyond this multiple of the width the page declares is wasted download.
+OVERSIZED_IMAGE_SCALE = 2
+
+# transfer_size is the size of the body as sent (after Content-Encoding), None if unknown.
+# width/height are intrinsic pixels for images; minified is None when the sample can't tell.
+class AssetInfo(namedtuple('AssetInfo', ['url', 'status_code', 'final_url', 'content_type', 'transfer_size', 'content_encoding',
+                                         'format', 'width', 'height', 'minified', 'etag', 'last_modified', 'error'])):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status_code is not None and self.status_code < 400
+
+    @property
+    def throttled(self):
+        # A 429/503 means the asset was not actually probed; see URLStatus.throttled.
+        return self.status_code in THROTTLE_STATUSES
+
+    @property
+    def broken(self):
+        return not self.ok and not self.throttled
+
+    @property
+    def compressed(self):
+        return self.content_encoding in COMPRESSED_ENCODINGS
+
+def parse_content_range(value):
+    # "bytes 0-16383/48213" -> 48213; None when the total is unknown ("*") or the header is missing.
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+def decode_prefix(data, content_encoding):
+    # Decodes the start of a gzip/deflate body; a truncated stream still yields everything before the cut.
+    if not content_encoding or content_encoding == 'identity':
+        return data
+    if content_encoding == 'gzip':
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif content_encoding == 'deflate':
+        decoder = zlib.decompressobj()
+    else:
+        return None
+    try:
+        return decoder.decompress(data)
+    except zlib.error:
+        return None
+
+def looks_minified(url, sample):
+    # sample is the decoded start of the file, or None if it could not be decoded; then only the
+    # ".min." naming convention is left to go on. Samples too small to matter give None.
+    if '.min.' in url.rsplit('/', 1)[-1]:
+        return True
+    if sample is None:
+        return False
+    if len(sample) < TEXT_ASSET_MIN_BYTES:
+        return None
+    text = sample.decode('utf-8', errors='replace')
+    lines = [line for line in text.splitlines() if line.strip()]
+    return not lines or len(text) / len(lines) >= MINIFIED_LINE_LENGTH
+
+def _jpeg_size(data):
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            position += 2
+            continue
+        # Start-of-frame markers carry the dimensions; C4, C8 and CC share the range but are not frames.
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        position += 2 + struct.unpack('>H', data[position + 2:position + 4])[0]
+    return None
+
+def jpeg_header_incomplete(data):
+    return data.startswith(b'\xff\xd8') and _jpeg_size(data) is None
+
+def image_info(data, content_type=None):
+    # (format, width, height) from the first bytes of an image. Dimensions are None when the header
+    # is not in data yet (JPEG) or the format has none (SVG).
+    if data.startswith(b'\x89PNG\r\n\x1a\n') and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return 'png', width, height
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return 'gif', width, height
+    if data.startswith(b'\xff\xd8'):
+        size = _jpeg_size(data)
+        return ('jpeg',) + (size or (None, None))
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return 'webp', width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = struct.unpack('<I', data[21:25])[0]
+            return 'webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            return 'webp', int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return 'webp', None, None
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type == 'image/svg+xml' or data.lstrip()[:5] in (b'<svg ', b'<?xml'):
+        return 'svg', None, None
+    if content_type.startswith('image/'):
+        return content_type[6:], None, None
+    return None, None, None
+
+def image_problems(info, declared_width=None):
+    # Reasons an image costs more than it should, for ImageAudit.
+    problems = []
+    if info.transfer_size and info.transfer_size > OVERSIZED_IMAGE_BYTES:
+        problems.append(f"{info.transfer_size / 1024:.0f} KB, over the {OVERSIZED_IMAGE_BYTES // 1024} KB budget")
+    if info.width and info.height and max(info.width, info.height) > OVERSIZED_IMAGE_PIXELS:
+        problems.append(f"{info.width}x{info.height} px, larger than any screen needs")
+    if info.width and declared_width and info.width > OVERSIZED_IMAGE_SCALE * declared_width:
+        problems.append(f"{info.width} px wide but displayed at {declared_width} px")
+    return problems
@@ -0,0 +1,428 @@
+from collections import Counter
+from urllib.parse import urljoin, urlparse
+
+from .assets import TEXT_ASSET_MIN_BYTES, image_problems
+from .fetch import PageSnapshot, fetch_page, get_page, normalize_url, safe_request_url
+from .instrument import traced, tracer
+from .llm import BUDGET_SKIPPED_SUGGESTION, LLM_AUDIT_TOKEN_BUDGET, get_gpt_insights, get_gpt_insights_batch
+from .pagespeed import analyze_pagespeed_data, get_pagespeed_reports
+from .prefilter import (ALT_TEXT_PASS_SCORE, anchor_text_problems, heading_problems, looks_decorative, page_keywords,
+                        score_alt_text)
+
+@traced("TT")
+def TT(page):
+    page = get_page(page)
+    if not page:
+        return "Failed to fetch title", "Error retrieving title from URL"
+    
+    title = page.facts.title
+    insights = ""
+    
+    if title is None:
+        return "No Title Found", "No title tag detected for the page."
+    elif len(title) < 50:
+        insights += "The title tag is shorter than the recommended 50-60 characters. Consider adding more descriptive keywords or phrases to improve its clarity."
+    elif len(title) > 60:
+        insights += "The title tag is longer than the recommended 50-60 characters. Consider shortening it while retaining its main message."
+    else:
+        insights += "The title tag is within the recommended length and seems well-optimized. Ensure it's relevant and unique to the content of the page."
+    
+    return title, insights
+
+@traced("MD")
+def MD(page):
+    page = get_page(page)
+    if not page:
+        return "Error retrieving meta description", "Failed to fetch content from URL"
+    
+    desc = page.facts.meta_description
+    insights = ""
+
+    if desc is not None:
+        
+        if len(desc) < 150:
+            insights += "The meta description is shorter than the recommended 150-160 characters. "
+            insights += "Consider expanding it to provide a more comprehensive summary of the page. "
+        elif len(desc) > 160:
+            insights += "The meta description is longer than the recommended 150-160 characters. "
+            insights += "Consider shortening it to make it concise. "
+        
+        ctas = ['learn more', 'discover', 'find out', 'get started', 'read on']
+        if not any(cta in desc.lower() for cta in ctas):
+            insights += "Consider adding a call to action in the meta description to entice users. "
+        
+        return desc, insights
+    else:
+        return None, "❌ Meta description is missing. Consider adding one to provide a brief summary of the page and improve click-through rates from search results."
+
+@traced("H1Audit")
+def H1Audit(page):
+    page = get_page(page)
+    if not page:
+        return "Error fetching URL", "Failed to retrieve content for H1 audit", ""
+
+    h1_elements = page.facts.h1s
+
+    if not h1_elements:
+        optimization = "H1 Missing"
+        details = ("This page doesn't have an H1 heading. H1 headings are crucial for search engines to "
+                   "understand the main topic of a webpage. They provide a clear and concise summary of the "
+                   "content and improve the overall user experience by making the content more scannable and organized. "
+                   "H1 headings also help search engines determine the relevance of a webpage to specific search queries, "
+                   "increasing the chances of ranking higher in search engine results pages (SERPs).")
+        recommendations = ("- Add an H1 heading to the page.\n"
+                           "- Ensure the H1 heading accurately reflects the main topic of the webpage.\n"
+                           "- Use relevant keywords in the H1 heading.\n"
+                           "- Optimize the H1 heading to increase the chances of ranking higher in SERPs.\n"
+                           "- Consider the overall on-page optimization efforts when adding the H1 heading.")
+        return optimization, details, recommendations
+
+    elif len(h1_elements) > 1:
+        optimization = "Multiple H1s Found"
+        details = ("Having multiple H1 headings on a page is not considered best practice from an SEO perspective. "
+                   "H1 headings are used to indicate the main topic or focus of a page, and having multiple H1 headings "
+                   "can confuse search engines and users about the primary content of the page.")
+        h1_texts = h1_elements
+        primary_h1_suggestion = get_gpt_insights(f"Which should be the primary H1 heading among: {', '.join(h1_texts)}?")
+        recommendations = (f"- Consolidate H1 headings: Choose one primary heading that best reflects the main topic "
+                           f"or focus of the page. In this case, \"{primary_h1_suggestion}\" seems to be the most suitable "
+                           "H1 heading. Remove any other H1 headings on the page.\n"
+                           "- Use subheadings: Use appropriate subheadings such as H2, H3, etc., to organize the information.\n"
+                           "- Optimize for keywords: Ensure the chosen H1 heading includes relevant keywords.\n"
+                           "- Review content structure: Ensure the content flows well and supports the main H1 topic.\n"
+                           "- Test and monitor: Monitor page performance and make adjustments based on data.")
+        return optimization, details, recommendations
+
+    else:
+        optimization = "Single H1 Found"
+        h1_text = h1_elements[0]
+        problems = heading_problems(h1_text, page.facts.title)
+        if not problems:
+            tracer.record_llm_skip("H1Audit", "prefilter", 1)
+            details = f"The page has an H1 heading: {h1_text}. It seems to be well-optimized."
+            return optimization, details, "No change needed: the H1 is specific, a good length and matches the title."
+        alternative_h1_suggestion = get_gpt_insights(f"Suggest an alternative SEO-optimized H1 heading for: {h1_text}")
+        details = f"The page has an H1 heading: {h1_text}. It {' and '.join(problems)}."
+        recommendations = f"Alternative H1 Suggestion for better optimization: {alternative_h1_suggestion}"
+        return optimization, details, recommendations
+
+def image_urls(page):
+    # The same-site images ImageAudit probes.
+    base_domain = urlparse(page.url).netloc
+    return [urljoin(page.url, img.src) for img in page.facts.images if base_domain in urlparse(urljoin(page.url, img.src)).netloc]
+
+def internal_link_urls(page):
+    # {absolute URL: href} for the main-content links LinkingAudit checks.
+    base_domain = urlparse(page.url).netloc
+    internal_links = {}
+    for link in page.facts.main_content_links:
+        full_url = urljoin(page.url, link.href)
+        if base_domain in urlparse(full_url).netloc and full_url not in internal_links and not link.href.startswith('#'):
+            internal_links[full_url] = link.href
+    return internal_links
+
+def crawlability_link_urls(page):
+    # The internal links and canonical URL crawlability_insights checks, resolved against the page.
+    url = page.url
+    internal_links = [link.href for link in page.facts.links if urlparse(url).netloc in urlparse(link.href).netloc]
+    canonical = page.facts.canonical
+    return [urljoin(url, link) for link in internal_links], urljoin(url, canonical) if canonical else None
+
+@traced("ImageAudit")
+def ImageAudit(page):
+    page = get_page(page)
+    if not page:
+        return {"error": "Failed to retrieve content for image audit"}
+
+    url = page.url
+    img_elements = page.facts.images
+
+    missing_alt = []
+    existing_alt = []
+    broken_imgs = []
+    non_descriptive_names = []
+    decorative_imgs = set()
+
+    # Status, byte size and pixel size all come from the first few KB of each image.
+    img_infos = page.checker.probe(image_urls(page), image=True)
+    oversized_imgs = {}
+    # Alt texts shared by different images, which can't all be describing theirs.
+    alt_counts = Counter(" ".join(alt.split()).lower() for _, alt in {(img.src, img.alt) for img in img_elements if img.alt})
+
+    for img in img_elements:
+        img_src = urljoin(url, img.src)
+        if looks_decorative(img, img_infos.get(img_src)):
+            decorative_imgs.add(img_src)
+        if img.alt:
+            existing_alt.append((img_src, img.alt))
+        # An empty alt is the right markup for a decorative image.
+        elif img.alt is None or img_src not in decorative_imgs:
+            missing_alt.append(img_src)
+
+        if img_src in img_infos and img_infos[img_src].broken:
+            broken_imgs.append(img_src)
+        elif img_src in img_infos and img_infos[img_src].ok:
+            declared_width = int(img.width) if img.width and img.width.strip().isdigit() else None
+            problems = image_problems(img_infos[img_src], declared_width)
+            if problems:
+                oversized_imgs[img_src] = (f"{'; '.join(problems)}. Resize it to the size it is displayed at and serve "
+                                           "a compressed format such as WebP or AVIF.")
+
+        img_name = urlparse(img.src).path.split('/')[-1]
+        if len(img_name.split('-')) <= 1:
+            non_descriptive_names.append(img_src)
+
+    # Only items that fail the local checks go to GPT. Decorative images need an empty alt rather
+    # than a description, and alt texts that score well are kept as they are.
+    page_words = page_keywords(page.facts)
+    weak_alts = {}
+    for img_src, alt_text in existing_alt:
+        score, reasons = score_alt_text(alt_text, img_src, page_words, alt_counts[" ".join(alt_text.split()).lower()] > 1)
+        if score < ALT_TEXT_PASS_SCORE:
+            weak_alts[img_src] = f"The current alt text {' and '.join(reasons)}."
+
+    alt_prompts = [(img_src, f"Suggest an alt text for the image with filename: {urlparse(img_src).path.split('/')[-1]}")
+                   for img_src in missing_alt if img_src not in decorative_imgs]
+    improved_alt_prompts = [(img_src, f"Suggest a better alt text for the image with current alt text: {alt_text}")
+                            for img_src, alt_text in existing_alt if img_src in weak_alts]
+    filename_prompts = [(img_src, f"Suggest a more descriptive filename for the image with current name: {urlparse(img_src).path.split('/')[-1]}")
+                        for img_src in non_descriptive_names if img_src not in decorative_imgs]
+
+    prompts = [prompt for _, prompt in alt_prompts + improved_alt_prompts + filename_prompts]
+    tracer.record_llm_skip("ImageAudit", "prefilter", len(missing_alt) + len(existing_alt) + len(non_descriptive_names) - len(prompts))
+    suggestions = get_gpt_insights_batch(prompts, "ImageAudit", LLM_AUDIT_TOKEN_BUDGET)
+    improved = {img_src: f"{weak_alts[img_src]} {suggestions.get(prompt, BUDGET_SKIPPED_SUGGESTION)}"
+                for img_src, prompt in improved_alt_prompts}
+
+    alt_recommendations = [(img_src, suggestions.get(prompt, BUDGET_SKIPPED_SUGGESTION)) for img_src, prompt in alt_prompts]
+    alt_recommendations += [(img_src, 'This image looks decorative: give it an empty alt="" so screen readers skip it.')
+                            for img_src in missing_alt if img_src in decorative_imgs]
+    improved_alt_texts = [(img_src, improved.get(img_src, "The current alt text is descriptive; no change needed."))
+                          for img_src, _ in existing_alt]
+    improved_filenames = [(img_src, suggestions.get(prompt, BUDGET_SKIPPED_SUGGESTION)) for img_src, prompt in filename_prompts]
+
+    return {
+        "missing_alt": (missing_alt, "Images should have alt attributes for accessibility and SEO.", alt_recommendations),
+        "existing_alt": (existing_alt, "Checking the descriptiveness of existing alt texts.", improved_alt_texts),
+        "broken_imgs": (broken_imgs, "Broken images can lead to poor user experience.", "Consider re-uploading or fixing the source of the broken images."),
+        "oversized_imgs": (list(oversized_imgs), "Oversized images slow down page loads.", list(oversized_imgs.items())),
+        "non_descriptive_names": (non_descriptive_names, "Descriptive image filenames can help with image SEO.", improved_filenames)
+    }
+
+@traced("LinkingAudit")
+def LinkingAudit(page):
+    url = page.url if isinstance(page, PageSnapshot) else page
+    try:
+        page = get_page(page)
+        if not page:
+            return [{"issue": "Error fetching URL", "solution": "Failed to retrieve content for linking audit", "example": url}]
+
+        structured_issues = []
+        internal_links = internal_link_urls(page)
+        link_statuses = page.checker.check(internal_links)
+        for full_url, href in internal_links.items():
+            link_status = link_statuses[full_url]
+            if link_status.throttled:
+                # Without "url" this is not counted as a broken link.
+                structured_issues.append({
+                    "issue": f"Internal link not checked: {full_url}",
+                    "solution": f"The server throttled the check (Status Code: {link_status.status_code}). Re-run the audit later.",
+                    "example": href
+                })
+            elif not link_status.ok:
+                structured_issues.append({
+                    "issue": f"Broken internal link found: {full_url}",
+                    "solution": f"Ensure the link is pointing to the correct location. Status Code: {link_status.status_code or 'Failed to fetch'}",
+                    "example": href,
+                    "url": full_url
+                })
+
+        if not structured_issues:
+            structured_issues.append({
+                "issue": "No internal linking issues found.",
+                "solution": "All internal links on the page seem to be working correctly."
+            })
+
+        return structured_issues
+    except Exception as e:
+        return [{"issue": "Unexpected error during linking audit", "solution": str(e), "example": url}]
+
+@traced("AnchorTextAudit")
+def AnchorTextAudit(page):
+    try:
+        page = get_page(page)
+        if not page:
+            return ["Error fetching URL"], ["Failed to retrieve content for anchor text audit"]
+
+        anchor_texts = [(link.text, link.href) for link in page.facts.main_content_links if link.text]
+        # Anchor texts shared by links to different pages don't tell users or search engines which is which.
+        targets = {}
+        for text, href in anchor_texts:
+            targets.setdefault(" ".join(text.split()).lower(), set()).add(normalize_url(urljoin(page.url, href)))
+
+        links_to_improve = []
+        anchor_prompts = []
+
+        # Only anchors that fail the local checks get a GPT suggestion; descriptive ones are left alone.
+        for text, href in dict.fromkeys(anchor_texts):
+            problems = anchor_text_problems(text, len(targets[" ".join(text.split()).lower()]) > 1)
+            if problems:
+                links_to_improve.append(f"Link: {href} | Anchor Text: '{text}' ({' and '.join(problems)})")
+                anchor_prompts.append(f"Suggest a better anchor text for a link pointing to: {href}")
+        tracer.record_llm_skip("AnchorTextAudit", "prefilter", len(set(anchor_texts)) - len(anchor_prompts))
+
+        if not links_to_improve:
+            return ["No Links to Improve Found"], ["All anchor texts on the page seem well-optimized."]
+
+        suggestions = get_gpt_insights_batch(anchor_prompts, "AnchorTextAudit", LLM_AUDIT_TOKEN_BUDGET)
+        recommended_anchor_texts = [suggestions.get(prompt, BUDGET_SKIPPED_SUGGESTION) for prompt in anchor_prompts]
+
+        return links_to_improve, recommended_anchor_texts
+    except Exception as e:
+        return ["Unexpected error during anchor text audit"], [str(e)], []
+
+@traced("crawlability_insights")
+def crawlability_insights(page):
+    issues = []
+    url = page.url if isinstance(page, PageSnapshot) else page
+
+    def resolve(target_url):
+        if not urlparse(target_url).scheme:
+            return urljoin(url, target_url)
+        return target_url
+
+    page = get_page(page)
+    if not page:
+        return issues
+
+    facts = page.facts
+
+    canonical_link = facts.canonical
+    css_files = facts.stylesheets
+    js_files = facts.scripts
+    internal_links, canonical_url = crawlability_link_urls(page)
+
+    # Queue the plain status checks first so they run while the asset probes are awaited. Probes read
+    # the first few KB of each file and take the transferred size from the headers.
+    checker = page.checker
+    link_futures = {link: checker.submit(link) for link in internal_links}
+    canonical_future = checker.submit(canonical_url) if canonical_url else None
+    assets = css_files + js_files
+    probed = checker.probe([resolve(asset) for asset in assets])
+    asset_infos = {asset: probed[resolve(asset)] for asset in assets}
+
+    if canonical_future and canonical_future.result().broken:
+        issues.append(("CANON",
+                       f"This page has a broken canonical link pointing to {canonical_link}.",
+                       "Ensure the canonical link points to a valid and accessible URL."))
+
+    broken_js_css = [asset for asset in css_files + js_files if asset_infos[asset].broken]
+
+    if broken_js_css:
+        issues.append(("JSCSS", 
+                       f"Issues with broken internal JavaScript and CSS files: {', '.join(broken_js_css)}",
+                       "Ensure all linked JS and CSS files are accessible."))
+
+    num_files = len(css_files + js_files)
+    total_js_css_size = sum(asset_infos[asset].transfer_size or 0 for asset in css_files + js_files if asset_infos[asset].ok)
+    
+    if num_files > 10:
+        issues.append(("JSCSSFILES", 
+                       f"This page uses {num_files} JavaScript and CSS files, which is considered excessive.", 
+                       "Consider combining and minifying JS and CSS files to reduce the number of HTTP requests."))
+
+    if total_js_css_size > 1 * 1024 * 1024:
+        issues.append(("JSCSSSIZE", 
+                       f"The JavaScript and CSS on this page transfer {total_js_css_size / (1024 * 1024):.2f}MB, which is considered too large.", 
+                       "Optimize and compress JS and CSS files to improve page load time."))
+
+    uncompressed_files = [asset for asset in css_files + js_files if asset_infos[asset].ok and not asset_infos[asset].compressed
+                          and (asset_infos[asset].transfer_size or 0) >= TEXT_ASSET_MIN_BYTES]
+    if uncompressed_files:
+        issues.append(("COMPRESS",
+                       f"JavaScript and CSS files served without compression: {', '.join(uncompressed_files)}",
+                       "Enable gzip or Brotli compression for text assets on the server."))
+
+    # A link the server throttled was never checked, so it is not reported as broken.
+    non_crawlable_links = [link for link, future in link_futures.items() if future.result().broken]
+    if non_crawlable_links:
+        issues.append(("LINKCRAWL",
+                       f"Links on this page couldn't be crawled (incorrect URL formats): {', '.join(non_crawlable_links)}",
+                       "Ensure all internal links on the page point to valid and accessible URLs."))
+
+    unminified_files = [asset for asset in css_files + js_files if asset_infos[asset].ok and asset_infos[asset].minified is False]
+    if unminified_files:
+        issues.append(("MINIFY",
+                       f"Issues with unminified JavaScript and CSS files: {', '.join(unminified_files)}",
+                       "Minify the JS and CSS files to improve page load time."))
+
+    return issues
+
+@traced("accessibility_insights")
+def accessibility_insights(page):
+    issues = []
+    visited_urls = set()
+
+    # The snapshot's GET already followed redirects, so its history replaces the separate HEAD request.
+    if page is None or isinstance(page, PageSnapshot):
+        response = page.response if page else None
+    else:
+        response = safe_request_url(page, method='HEAD')
+    
+    if not response:
+        issues.append(("URLRES", "URL does not resolve.", "Ensure the URL is correct and the server is responsive."))
+        return issues
+
+    if len(response.history) > 1:
+        for r in response.history:
+            if r.url in visited_urls:
+                issues.append(("REDIRCHAIN", "Redirect chains and loops detected on this page.", f"The URL {r.url} was redirected to multiple times. Ensure redirects are set up correctly to avoid loops."))
+                break
+            visited_urls.add(r.url)
+
+    if response.history:
+        last_redirect = response.history[-1]
+        if last_redirect.status_code == 301:
+            issues.append(("PERMREDIR", "This URL has a permanent redirect.", f"The URL redirects permanently (301) to {response.url}. Ensure this is intended and update references to the original URL if necessary."))
+        else:
+            issues.append(("TEMPREDIR", "This URL has a temporary redirect.", f"The URL redirects temporarily ({last_redirect.status_code}) to {response.url}. Ensure this is intended, as temporary redirects might not pass link equity in the same way permanent redirects do."))
+
+    if any(issue[0] in ["TEMPREDIR", "PERMREDIR", "REDIRCHAIN"] for issue in issues):
+        issues.append(("REDIR", "This URL has a redirect issue.", "Review the specific redirect issues listed above and rectify as necessary."))
+
+    return issues
+
+AUDIT_SECTIONS = ("title", "meta", "h1", "images", "linking", "anchors", "pagespeed", "crawlability", "accessibility")
+
+def run_section(section, url, page, pagespeed_api_key=None):
+    # Runs one audit section and returns a JSON-serializable result.
+    if section == "title":
+        return dict(zip(("title", "recommendations"), TT(page)))
+    if section == "meta":
+        return dict(zip(("meta_description", "recommendations"), MD(page)))
+    if section == "h1":
+        return dict(zip(("optimization", "details", "recommendations"), H1Audit(page)))
+    if section == "images":
+        return ImageAudit(page)
+    if section == "linking":
+        return LinkingAudit(page)
+    if section == "anchors":
+        return dict(zip(("links_to_improve", "suggestions"), AnchorTextAudit(page)))
+    if section == "pagespeed":
+        results = {}
+        for strategy, data in get_pagespeed_reports(url, api_key=pagespeed_api_key).items():
+            crux_metrics, lighthouse_metrics = analyze_pagespeed_data(data)
+            results[strategy] = {"crux": crux_metrics, "lighthouse": lighthouse_metrics, "error": data.get("error")}
+        return results
+    if section == "crawlability":
+        return [dict(zip(("code", "issue", "solution"), issue)) for issue in crawlability_insights(page)]
+    if section == "accessibility":
+        return [dict(zip(("code", "issue", "solution"), issue)) for issue in accessibility_insights(page)]
+    raise ValueError(f"Unknown audit section: {section}")
+
+def run_audit(url, sections=AUDIT_SECTIONS, pagespeed_api_key=None):
+    page = fetch_page(url)
+    results = {"url": url, "fetched": page is not None, "sections": {}}
+    for section in sections:
+        results["sections"][section] = run_section(section, url, page, pagespeed_api_key)
+    return results
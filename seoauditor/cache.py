@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Least recently used entries read per round when the cache is over its byte budget.
+CACHE_EVICT_BATCH = 100
+
+# Disk-backed key/value cache used for GPT responses and PageSpeed reports. Keys are hashed
+# from their parts, e.g. cache.get(model, system_prompt, prompt) or cache.set(url, strategy, payload).
+class DiskCache:
+    # SQLite in WAL mode lets several Streamlit sessions and worker processes read and write concurrently.
+    # The database is created on first use, so the module-level caches don't touch the disk on import.
+    def __init__(self, path, ttl, max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._created = False
+        self._create_lock = threading.Lock()
+
+    def _create(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with sqlite3.connect(self.path, timeout=30) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                         "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # A running total of the stored bytes, so writes don't have to sum the whole table. Triggers
+            # keep it in step with every insert, update and delete, from any process.
+            conn.execute("INSERT OR IGNORE INTO stats (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM responses")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN "
+                         "UPDATE stats SET value = value + NEW.size WHERE name = 'bytes'; END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses BEGIN "
+                         "UPDATE stats SET value = value + NEW.size - OLD.size WHERE name = 'bytes'; END")
+            conn.execute("CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN "
+                         "UPDATE stats SET value = value - OLD.size WHERE name = 'bytes'; END")
+
+    def _connect(self):
+        if not self._created:
+            with self._create_lock:
+                if not self._created:
+                    self._create()
+                    self._created = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def _count(self, conn, name):
+        conn.execute("INSERT INTO stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, *key_parts):
+        key = self.make_key(*key_parts)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+            return row[0]
+
+    def set(self, *key_parts_and_value):
+        *key_parts, value = key_parts_and_value
+        key = self.make_key(*key_parts)
+        now = time.time()
+        with self._connect() as conn:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the delete trigger.
+            conn.execute("INSERT INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                         "created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+                         (key, value, len(value.encode("utf-8")), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        total = self._bytes(conn)
+        # Drop least recently used entries until the cache is back under its byte budget.
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT ?", (CACHE_EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(conn, "evictions")
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _bytes(conn):
+        return conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+
+    def stats(self):
+        if not self._created and not os.path.exists(self.path):
+            return {"hits": 0, "misses": 0, "evictions": 0, "entries": 0, "bytes": 0}
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            size = self._bytes(conn)
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0),
+                "evictions": counters.get("evictions", 0), "entries": entries, "bytes": size}
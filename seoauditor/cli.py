@@ -0,0 +1,172 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .audits import AUDIT_SECTIONS, run_audit
+from .history import AUDIT_HISTORY_PATH, AuditHistory, run_incremental_audit
+from .instrument import Metrics, to_json_lines, tracer
+from .llm import LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, configure_llm
+from .pagespeed import PAGESPEED_REQUESTS_PER_MINUTE, configure_pagespeed
+from .politeness import HOST_MAX_CONCURRENCY, HOST_MAX_RPS, MAX_CONNECTIONS, host_scheduler
+from .results import open_run
+from .sitemaps import SITEMAP_ISSUE_CODES, SitemapReader, parse_lastmod
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m seoauditor",
+                                     description="Audit URLs in parallel and write one JSON line per URL to stdout.")
+    parser.add_argument("input", nargs="?", default="-", help="File with one URL per line, or - to read stdin (default).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--trace", metavar="PATH", help="Write span, HTTP and LLM trace records as JSON lines to PATH.")
+    parser.add_argument("--metrics", metavar="PATH", help="Write aggregated Prometheus text metrics to PATH when done.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-audit against the audit history: conditional fetches, reuse unchanged sections, add a diff.")
+    parser.add_argument("--history", metavar="PATH", default=AUDIT_HISTORY_PATH,
+                        help=f"Audit history database for --incremental (default: {AUDIT_HISTORY_PATH}).")
+    parser.add_argument("--store", metavar="PATH",
+                        help="Also write results to this result database. An unfinished run of the same name is resumed, "
+                             "skipping the URLs it already stored; once a run has finished, the next one starts afresh.")
+    parser.add_argument("--run", metavar="NAME",
+                        help="Run name inside --store; each run is stored as NAME@<start time> (default NAME: derived from the input path).")
+    parser.add_argument("--sitemap", metavar="URL",
+                        help="Audit the URLs listed in this sitemap or sitemap index, or in the sitemaps a site's robots.txt names, instead of input.")
+    parser.add_argument("--include", metavar="REGEX", action="append", default=[],
+                        help="With --sitemap, only audit URLs matching this pattern (repeatable).")
+    parser.add_argument("--exclude", metavar="REGEX", action="append", default=[],
+                        help="With --sitemap, skip URLs matching this pattern (repeatable).")
+    parser.add_argument("--since", metavar="DATE", help="With --sitemap, skip URLs whose lastmod is before this date (YYYY-MM-DD).")
+    parser.add_argument("--max-urls", type=int, help="With --sitemap, stop after this many URLs.")
+    parser.add_argument("--sections", default=",".join(AUDIT_SECTIONS),
+                        help=f"Comma-separated audit sections to run (default: all of {','.join(AUDIT_SECTIONS)}).")
+    args = parser.parse_args(argv)
+    args.sections = tuple(section.strip() for section in args.sections.split(",") if section.strip())
+    unknown = set(args.sections) - set(AUDIT_SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+    if args.since is not None:
+        args.since = parse_lastmod(args.since)
+        if args.since is None:
+            parser.error("--since must be a date like 2024-05-01")
+    # Sitemap URLs are reported as redirected or broken from the accessibility checks.
+    if args.sitemap and "accessibility" not in args.sections:
+        args.sections += ("accessibility",)
+    if args.run is None:
+        if args.sitemap:
+            args.run = "cli:sitemap:" + args.sitemap
+        else:
+            args.run = "cli:" + ("stdin" if args.input == "-" else os.path.abspath(args.input))
+    return args
+
+def read_urls(source):
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+# Set per worker process by init_worker when --incremental is on.
+audit_history = None
+
+def init_worker(pagespeed_rpm, workers, trace, history_path=None):
+    global audit_history
+    configure_pagespeed(pagespeed_rpm)
+    # The OpenAI account limits are shared by all workers too.
+    configure_llm(max(1, LLM_REQUESTS_PER_MINUTE // workers), max(1, LLM_TOKENS_PER_MINUTE // workers))
+    # Every worker may hit the same site, so each gets an equal share of the per-host limits.
+    host_scheduler.configure(max(1, MAX_CONNECTIONS // workers), max(1, HOST_MAX_CONCURRENCY // workers), HOST_MAX_RPS / workers)
+    if trace:
+        tracer.enable()
+    if history_path:
+        audit_history = AuditHistory(history_path)
+
+def add_sitemap_fields(record, entry):
+    record["sitemap"] = entry.sitemap
+    record["lastmod"] = entry.lastmod.isoformat() if entry.lastmod else None
+    accessibility = record.get("sections", {}).get("accessibility") or []
+    record["sitemap_issues"] = [issue["code"] for issue in accessibility if issue["code"] in SITEMAP_ISSUE_CODES]
+
+def audit_to_json(url, sections, sitemap_entry=None):
+    # Runs in a worker process; failures become part of the JSON line instead of killing the batch.
+    # Returns the line plus this URL's trace records so the parent can aggregate them.
+    mark = tracer.mark()
+    start = time.monotonic()
+    try:
+        with tracer.span("run_audit", url=url):
+            if audit_history is not None:
+                record = run_incremental_audit(url, audit_history, sections)
+            else:
+                record = run_audit(url, sections)
+    except Exception as e:
+        record = {"url": url, "fetched": False, "error": f"{type(e).__name__}: {e}"}
+    if sitemap_entry is not None:
+        add_sitemap_fields(record, sitemap_entry)
+    record["elapsed"] = round(time.monotonic() - start, 3)
+    trace_records = tracer.records(since=mark) if tracer.enabled else []
+    tracer.clear()
+    return json.dumps(record, ensure_ascii=False), trace_records
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr, format="%(levelname)s %(name)s: %(message)s")
+
+    if args.sitemap:
+        source = None
+        reader = SitemapReader(args.sitemap, args.include, args.exclude, args.since, args.max_urls)
+        # URLs are audited as the sitemaps are parsed, not after the download.
+        entries = ((entry.url, entry) for entry in reader)
+    else:
+        source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        entries = ((url, None) for url in read_urls(source))
+    trace_file = open(args.trace, "w", encoding="utf-8") if args.trace else None
+    tracing = bool(args.trace or args.metrics)
+    # The parent only aggregates records from the workers; it does not trace itself.
+    metrics = Metrics()
+    store = open_run(args.run, args.store) if args.store else None
+    if store:
+        print(f"Storing results as run {store.run_id}", file=sys.stderr)
+
+    def emit(future):
+        line, trace_records = future.result()
+        print(line, flush=True)
+        if store:
+            store.add_audit(json.loads(line))
+        if trace_file:
+            trace_file.write(to_json_lines(trace_records))
+        if args.metrics:
+            metrics.add_records(trace_records)
+
+    try:
+        # Each worker process gets an equal share of the PageSpeed per-minute quota.
+        pagespeed_rpm = max(1, PAGESPEED_REQUESTS_PER_MINUTE // args.workers)
+        history_path = args.history if args.incremental else None
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(pagespeed_rpm, args.workers, tracing, history_path)) as executor:
+            # Keep a bounded window of submitted URLs so huge inputs stream through in constant memory.
+            pending = set()
+            for url, sitemap_entry in entries:
+                if store and store.has_page(url):
+                    continue
+                pending.add(executor.submit(audit_to_json, url, args.sections, sitemap_entry))
+                if len(pending) >= args.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(future)
+            for future in wait(pending).done:
+                emit(future)
+        if args.sitemap:
+            print(f"Read {len(reader.sitemaps_read)} sitemaps: {reader.urls_listed} URLs listed, {reader.duplicates} duplicates, "
+                  f"{reader.filtered} filtered out, {reader.urls_yielded} audited", file=sys.stderr)
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.to_prometheus())
+        if store:
+            store.finish()
+    finally:
+        if store:
+            store.close()
+        if source is not None and source is not sys.stdin:
+            source.close()
+        if trace_file:
+            trace_file.close()
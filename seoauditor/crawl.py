@@ -0,0 +1,133 @@
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from .audits import MD, TT, LinkingAudit, accessibility_insights, crawlability_insights
+from .fetch import PageSnapshot, URLChecker, http_request, normalize_url, robots_cache
+
+# links holds (normalized target URL, in_chrome) pairs for HTML pages, for building the site's link graph;
+# content_text is the main-content text, for duplicate detection; redirect_codes are the
+# accessibility_insights codes for redirects on the way to the page.
+CrawlPageResult = namedtuple('CrawlPageResult', ['url', 'depth', 'status_code', 'is_html', 'title',
+                                                 'meta_description', 'h1_count', 'broken_links', 'issue_codes', 'error',
+                                                 'links', 'content_text', 'redirect_codes'], defaults=((), None, ()))
+
+def extract_crawl_links(page):
+    links = []
+    for link in page.facts.links:
+        full_url = urljoin(page.final_url, link.href)
+        if urlparse(full_url).scheme in ('http', 'https'):
+            links.append((normalize_url(full_url), link.in_chrome))
+    return links
+
+def audit_crawled_page(page_url, depth, checker):
+    # Runs the GPT-free audits on one crawled page and returns its result plus outgoing links.
+    try:
+        response = http_request(page_url)
+    except requests.RequestException as e:
+        return CrawlPageResult(page_url, depth, None, False, None, None, 0, [], [], str(e)), []
+    if response.status_code >= 400:
+        return CrawlPageResult(page_url, depth, response.status_code, False, None, None, 0, [], [], f"HTTP {response.status_code}"), []
+    if 'html' not in response.headers.get('Content-Type', 'text/html'):
+        return CrawlPageResult(page_url, depth, response.status_code, False, None, None, 0, [], [], None), []
+
+    page = PageSnapshot(page_url, response, checker=checker)
+    title, _ = TT(page)
+    meta_description, _ = MD(page)
+    broken_links = [issue["url"] for issue in LinkingAudit(page) if "url" in issue]
+    issue_codes = [issue[0] for issue in crawlability_insights(page)]
+    # The snapshot already holds the redirect history, so this costs no request. REDIR only summarizes the others.
+    redirect_codes = [issue[0] for issue in accessibility_insights(page) if issue[0] != "REDIR"]
+    links = extract_crawl_links(page)
+    result = CrawlPageResult(page_url, depth, response.status_code, True, None if title == "No Title Found" else title,
+                             meta_description, len(page.facts.h1s), broken_links, issue_codes, None, links,
+                             page.facts.content_text, redirect_codes)
+    return result, links
+
+class CrawlFrontier:
+    # The crawl's seen set and breadth-first queue. Only URLs that will actually be crawled are queued,
+    # so neither ever grows past max_pages. seeds is an optional iterable of further start URLs (e.g.
+    # from a sitemap); they are pulled one at a time as the crawl has room and enter at depth 0.
+    def __init__(self, seed_url, max_pages=100, max_depth=3, seen=None, queue=None, seeds=None):
+        self.seed = normalize_url(seed_url)
+        self.host = urlparse(self.seed).netloc
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        if seen is None:
+            seen, queue = {self.seed}, [(self.seed, 0)]
+        self.seen = set(seen)
+        self.queue = deque(queue)
+        self.seeds = iter(seeds) if seeds is not None else None
+
+    def discover(self, links, depth):
+        # Queues the new same-host links of a page at depth and returns them as (url, depth) pairs.
+        queued = []
+        if depth < self.max_depth:
+            for link, _ in links:
+                if len(self.seen) >= self.max_pages:
+                    break
+                if link not in self.seen and urlparse(link).netloc == self.host:
+                    self.seen.add(link)
+                    self.queue.append((link, depth + 1))
+                    queued.append((link, depth + 1))
+        return queued
+
+    def pop(self):
+        # The next (url, depth) to crawl, or None when there is nothing left. Seeds come right after the
+        # start page and before the links found on pages, so a streamed sitemap is audited while it downloads.
+        if self.seeds is not None and not (self.queue and self.queue[0][1] == 0):
+            seed = self._next_seed()
+            if seed is not None:
+                return seed, 0
+        return self.queue.popleft() if self.queue else None
+
+    def _next_seed(self):
+        while len(self.seen) < self.max_pages:
+            seed = next(self.seeds, None)
+            if seed is None:
+                break
+            seed = normalize_url(seed)
+            if seed not in self.seen and urlparse(seed).netloc == self.host:
+                self.seen.add(seed)
+                return seed
+        # Closing a generator source also ends its sitemap download.
+        if hasattr(self.seeds, "close"):
+            self.seeds.close()
+        self.seeds = None
+        return None
+
+def crawl_site(seed_url, max_pages=100, max_depth=3, max_workers=8, frontier=None, on_result=None):
+    # Breadth-first walk of same-host links, yielding each CrawlPageResult as soon as it is ready.
+    # Pass a restored frontier to resume a crawl; on_result(result, queued) sees each result together
+    # with the links it added to the queue, before the result is yielded.
+    frontier = frontier or CrawlFrontier(seed_url, max_pages, max_depth)
+    checker = URLChecker()
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while len(in_flight) < max_workers:
+                next_page = frontier.pop()
+                if next_page is None:
+                    break
+                page_url, depth = next_page
+                if not robots_cache.allowed(page_url):
+                    result = CrawlPageResult(page_url, depth, None, False, None, None, 0, [], [], "Blocked by robots.txt")
+                    if on_result:
+                        on_result(result, [])
+                    yield result
+                    continue
+                in_flight[executor.submit(audit_crawled_page, page_url, depth, checker)] = depth
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = in_flight.pop(future)
+                result, links = future.result()
+                queued = frontier.discover(links, depth)
+                if on_result:
+                    on_result(result, queued)
+                yield result
@@ -0,0 +1,164 @@
+import hashlib
+import re
+import zlib
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+# Cross-page duplicate detection for titles, meta descriptions and main content. Exact duplicates
+# come from a hash of the normalized text; near duplicates from MinHash signatures bucketed with
+# LSH banding, so only pages sharing a band are ever compared. Per page and field the index keeps
+# an 8-byte digest, the band keys and a b-bit signature (about 140 bytes), never the text itself.
+
+DUPLICATE_FIELDS = ("title", "meta_description", "content")
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Words per shingle. Titles are compared as bags of words; longer texts on overlapping word runs.
+SHINGLE_WORDS = {"title": 1, "meta_description": 2, "content": 5}
+MINHASH_CHUNK = 4096
+
+_PRIME = (1 << 31) - 1
+_MIX = np.uint64(1000003)
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+# Fixed seed so signatures from different runs and processes stay comparable.
+_random = np.random.RandomState(20240101)
+_HASH_A = _random.randint(1, _PRIME, size=(MINHASH_PERMUTATIONS, 1)).astype(np.uint64)
+_HASH_B = _random.randint(0, _PRIME, size=(MINHASH_PERMUTATIONS, 1)).astype(np.uint64)
+
+DuplicateCluster = namedtuple('DuplicateCluster', ['field', 'kind', 'urls', 'similarity'])
+
+def normalize_text(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+def shingle_hashes(tokens, k):
+    # Rolling combination of k consecutive token hashes; texts shorter than k become one shingle.
+    k = min(k, len(tokens))
+    count = len(tokens) - k + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        shingles = shingles * _MIX + tokens[offset:offset + count]
+    return np.unique(shingles % np.uint64(_PRIME))
+
+def text_shingles(normalized, field):
+    words = normalized.split()
+    tokens = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    return shingle_hashes(tokens, SHINGLE_WORDS[field])
+
+def minhash_signature(shingles):
+    signature = np.full(MINHASH_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), MINHASH_CHUNK):
+        chunk = shingles[start:start + MINHASH_CHUNK]
+        np.minimum(signature, ((_HASH_A * chunk + _HASH_B) % np.uint64(_PRIME)).min(axis=1), out=signature)
+    return signature
+
+def band_keys(signature):
+    rows = signature.reshape(LSH_BANDS, -1)
+    keys = np.zeros(LSH_BANDS, dtype=np.uint64)
+    for row in range(rows.shape[1]):
+        keys = keys * _MIX + rows[:, row]
+    return ((keys ^ (keys >> np.uint64(32))) & _LOW_32_BITS).astype(np.uint32)
+
+def estimate_similarity(bbits, reference):
+    # With 8-bit signatures unrelated values still match 1 time in 256; correct for that.
+    matches = (bbits == reference).mean(axis=1)
+    return np.clip((matches - 1 / 256) / (1 - 1 / 256), 0.0, 1.0)
+
+def _runs(values):
+    # Index groups of equal values with at least two members.
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    boundaries = np.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(values)]))
+    for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+        yield order[start:end]
+
+class _FieldIndex:
+    def __init__(self):
+        self.page_ids = array('i')
+        self.digests = array('Q')
+        self.band_keys = bytearray()
+        self.bbits = bytearray()
+
+    def add(self, page_id, normalized, field):
+        signature = minhash_signature(text_shingles(normalized, field))
+        self.page_ids.append(page_id)
+        self.digests.append(int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little"))
+        self.band_keys += band_keys(signature).tobytes()
+        self.bbits += (signature & np.uint64(0xFF)).astype(np.uint8).tobytes()
+
+class DuplicateDetector:
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.urls = []
+        self._indexes = {field: _FieldIndex() for field in DUPLICATE_FIELDS}
+
+    def add(self, url, title=None, meta_description=None, content_text=None):
+        page_id = len(self.urls)
+        self.urls.append(url)
+        for field, text in zip(DUPLICATE_FIELDS, (title, meta_description, content_text)):
+            normalized = normalize_text(text)
+            if normalized:
+                self._indexes[field].add(page_id, normalized, field)
+
+    def add_result(self, result):
+        if result.is_html and not result.error:
+            self.add(result.url, result.title, result.meta_description, result.content_text)
+
+    def clusters(self):
+        clusters = []
+        for field in DUPLICATE_FIELDS:
+            clusters.extend(self._field_clusters(field, self._indexes[field]))
+        return clusters
+
+    def _field_clusters(self, field, index):
+        n = len(index.page_ids)
+        if n < 2:
+            return []
+        page_ids = np.array(index.page_ids, dtype=np.int64)
+        digests = np.array(index.digests, dtype=np.uint64)
+        keys = np.frombuffer(bytes(index.band_keys), dtype=np.uint32).reshape(n, LSH_BANDS)
+        bbits = np.frombuffer(bytes(index.bbits), dtype=np.uint8).reshape(n, MINHASH_PERMUTATIONS)
+        parent = list(range(n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        clusters = []
+        for group in _runs(digests):
+            clusters.append(DuplicateCluster(field, "exact", [self.urls[page_ids[i]] for i in group], 1.0))
+            for i in group[1:]:
+                union(group[0], i)
+
+        # Within each LSH bucket, members are verified against the bucket's first page only, so a
+        # bucket costs O(size) comparisons rather than O(size²).
+        for band in range(LSH_BANDS):
+            for group in _runs(keys[:, band]):
+                similarity = estimate_similarity(bbits[group[1:]], bbits[group[0]])
+                for i in group[1:][similarity >= self.threshold]:
+                    union(group[0], i)
+
+        components = {}
+        for i in range(n):
+            root = find(i)
+            if root != i:
+                components.setdefault(root, [root]).append(i)
+        for members in components.values():
+            # Components made of one exact group are already reported above.
+            if len(set(digests[members].tolist())) < 2:
+                continue
+            members = np.array(members)
+            similarity = float(estimate_similarity(bbits[members[1:]], bbits[members[0]]).min())
+            clusters.append(DuplicateCluster(field, "near", [self.urls[page_ids[i]] for i in members], round(similarity, 2)))
+        clusters.sort(key=lambda cluster: (cluster.kind, -len(cluster.urls)))
+        return clusters
@@ -0,0 +1,167 @@
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# Everything the audits read from a page, collected in one pass over the HTML instead of
+# building a BeautifulSoup tree and running a find_all per audit.
+
+# width is the width attribute as written (e.g. "300" or "100%"), if any.
+# decorative marks images hidden from assistive technology with role="presentation"/"none" or aria-hidden.
+PageImage = namedtuple('PageImage', ['src', 'alt', 'in_chrome', 'width', 'decorative'], defaults=(None, False))
+PageLink = namedtuple('PageLink', ['href', 'text', 'in_chrome', 'in_main_content'])
+
+# Header/nav/footer are the page chrome LinkingAudit and AnchorTextAudit leave out.
+CHROME_TAGS = ('header', 'nav', 'footer')
+# Main content is the first <main>, else the first <article>, else the first <section>, else the whole page.
+CONTENT_TAGS = ('main', 'article', 'section')
+TEXT_TAGS = ('a', 'h1', 'title')
+RAW_TEXT_TAGS = ('script', 'style')
+TRACKED_TAGS = CHROME_TAGS + CONTENT_TAGS + TEXT_TAGS + RAW_TEXT_TAGS
+
+class PageFacts:
+    __slots__ = ('title', 'meta_description', 'canonical', 'stylesheets', 'scripts', 'h1s', 'images', 'links', 'content_text')
+
+    def __init__(self):
+        self.title = None
+        self.meta_description = None
+        self.canonical = None
+        self.stylesheets = []
+        self.scripts = []
+        self.h1s = []
+        self.images = []
+        self.links = []
+        # Visible text of the main content (same fallback as main_content_links), for duplicate detection.
+        self.content_text = ''
+
+    @property
+    def main_content_links(self):
+        return [link for link in self.links if link.in_main_content]
+
+class PageFactsParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.facts = PageFacts()
+        self._stack = []
+        self._chrome_depth = 0
+        # Per content tag: None (not seen yet), 'open' while inside the first one, 'closed' after it.
+        self._content_state = dict.fromkeys(CONTENT_TAGS)
+        self._text = {tag: None for tag in TEXT_TAGS}
+        self._open_link = None
+        self._pending_links = []
+        self._page_text = []
+        self._content_text = {tag: [] for tag in CONTENT_TAGS}
+        self._open_content_tags = []
+        self._has_meta_description = False
+        self._has_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a' and 'a' in self._stack:
+            # An <a> cannot contain another <a>; the parser closes the first one.
+            self._close('a')
+
+        if tag == 'img':
+            if attrs.get('src'):
+                decorative = (attrs.get('role') or '').lower() in ('presentation', 'none') or \
+                    (attrs.get('aria-hidden') or '').lower() == 'true'
+                self.facts.images.append(PageImage(attrs['src'], attrs.get('alt'), self._chrome_depth > 0, attrs.get('width'),
+                                                   decorative))
+        elif tag == 'meta':
+            if not self._has_meta_description and (attrs.get('name') or '').lower() == 'description':
+                self._has_meta_description = True
+                self.facts.meta_description = attrs.get('content') or ''
+        elif tag == 'link':
+            rel = (attrs.get('rel') or '').lower().split()
+            if 'canonical' in rel and self.facts.canonical is None and attrs.get('href'):
+                self.facts.canonical = attrs['href']
+            if 'stylesheet' in rel and attrs.get('href'):
+                self.facts.stylesheets.append(attrs['href'])
+        elif tag == 'script' and attrs.get('src'):
+            self.facts.scripts.append(attrs['src'])
+
+        if tag not in TRACKED_TAGS:
+            return
+        self._stack.append(tag)
+        if tag in CHROME_TAGS:
+            self._chrome_depth += 1
+        elif tag in CONTENT_TAGS:
+            if self._content_state[tag] is None and self._chrome_depth == 0:
+                self._content_state[tag] = 'open'
+                self._open_content_tags.append(tag)
+        elif tag in TEXT_TAGS:
+            self._text[tag] = []
+            if tag == 'a' and 'href' in attrs:
+                self._open_link = (attrs['href'] or '', self._chrome_depth > 0,
+                                   tuple(self._content_state[t] == 'open' for t in CONTENT_TAGS))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in TRACKED_TAGS:
+            self._close(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._stack:
+            self._close(tag)
+
+    def _close(self, tag):
+        while self._stack:
+            open_tag = self._stack.pop()
+            self._end(open_tag)
+            if open_tag == tag:
+                break
+
+    def _end(self, tag):
+        if tag in CHROME_TAGS:
+            self._chrome_depth -= 1
+        elif tag in CONTENT_TAGS:
+            if self._content_state[tag] == 'open':
+                self._content_state[tag] = 'closed'
+                self._open_content_tags.remove(tag)
+        elif tag in TEXT_TAGS:
+            text = ''.join(self._text[tag] or ())
+            self._text[tag] = None
+            if tag == 'a' and self._open_link is not None:
+                self._pending_links.append(self._open_link + (text,))
+                self._open_link = None
+            elif tag == 'h1':
+                self.facts.h1s.append(text)
+            elif tag == 'title' and not self._has_title:
+                self._has_title = True
+                self.facts.title = text
+
+    def handle_data(self, data):
+        if self._stack and self._stack[-1] in RAW_TEXT_TAGS:
+            return
+        if self._chrome_depth == 0 and self._text['title'] is None:
+            self._page_text.append(data)
+            for tag in self._open_content_tags:
+                self._content_text[tag].append(data)
+        for tag in TEXT_TAGS:
+            collected = self._text[tag]
+            if collected is not None:
+                # Matches BeautifulSoup's get_text(strip=True): every text node stripped, then joined.
+                if tag == 'title':
+                    collected.append(data)
+                else:
+                    stripped = data.strip()
+                    if stripped:
+                        collected.append(stripped)
+
+    def close(self):
+        super().close()
+        while self._stack:
+            self._end(self._stack.pop())
+        # Main content falls back from <main> to <article> to <section> to the whole page.
+        present = [self._content_state[tag] is not None for tag in CONTENT_TAGS]
+        container = present.index(True) if any(present) else None
+        content_text = self._content_text[CONTENT_TAGS[container]] if container is not None else self._page_text
+        self.facts.content_text = ' '.join(content_text)
+        for href, in_chrome, in_content, text in self._pending_links:
+            in_main_content = not in_chrome and (container is None or in_content[container])
+            self.facts.links.append(PageLink(href, text, in_chrome, in_main_content))
+        self._pending_links = []
+        return self.facts
+
+def extract_page_facts(html):
+    parser = PageFactsParser()
+    parser.feed(html)
+    return parser.close()
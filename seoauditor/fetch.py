@@ -0,0 +1,440 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .assets import (
+    ASSET_PROBE_BYTES,
+    IMAGE_HEADER_MAX_BYTES,
+    IMAGE_PROBE_BYTES,
+    AssetInfo,
+    decode_prefix,
+    image_info,
+    jpeg_header_incomplete,
+    looks_minified,
+    parse_content_range,
+)
+from .extract import extract_page_facts
+from .instrument import tracer
+from .politeness import THROTTLE_STATUSES, host_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Define headers with a User-Agent to mimic a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.159 Safari/537.36"
+}
+
+# Shared HTTP client settings.
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 20
+HTTP_MAX_RETRIES = 3
+HTTP_POOL_SIZE = 32
+HTTP_MAX_RESPONSE_BYTES = 10 * 1024 * 1024
+# Longest Retry-After urllib3 sleeps out itself, while the request holds its host slot. A server that
+# asks for longer gets its 429/503 back sooner, and host_scheduler pauses the host for the full wait.
+HTTP_MAX_RETRY_AFTER = 2
+# How many times a link check or probe that still ends in 429/503 is sent again once the host's pause is over.
+HTTP_THROTTLE_RECHECKS = 1
+# Parsed robots.txt files kept by robots_cache.
+ROBOTS_CACHE_MAX_ORIGINS = 1000
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+class CappedRetry(Retry):
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, HTTP_MAX_RETRY_AFTER)
+
+def build_http_session():
+    # Keep-alive pools per host, bounded retries for 429/5xx honouring Retry-After up to HTTP_MAX_RETRY_AFTER.
+    # requests already advertises gzip/deflate and decodes compressed bodies transparently.
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = CappedRetry(total=HTTP_MAX_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['HEAD', 'GET']), respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+http_session = build_http_session()
+
+def http_request(target_url, method='GET', stream=False, max_bytes=HTTP_MAX_RESPONSE_BYTES, timeout=None, polite=True, **kwargs):
+    # Every fetch goes through the shared session. Unless the caller streams, the body is
+    # read in chunks and the request is abandoned as soon as it exceeds max_bytes. Requests to
+    # audited sites wait for the per-host scheduler; API calls pass polite=False.
+    if not tracer.enabled:
+        return _http_request(target_url, method, stream, max_bytes, timeout, polite, **kwargs)
+
+    start = time.perf_counter()
+    status_code = size = None
+    try:
+        response = _http_request(target_url, method, stream, max_bytes, timeout, polite, **kwargs)
+        status_code = response.status_code
+        if method.upper() == 'HEAD':
+            size = 0
+        elif stream:
+            # The caller reads the body; max_bytes is the most it says it will read.
+            content_length = response.headers.get('Content-Length')
+            size = int(content_length) if content_length and content_length.isdigit() else None
+            if size is not None and max_bytes:
+                size = min(size, max_bytes)
+        else:
+            size = len(response.content)
+        return response
+    finally:
+        tracer.record_http(method.upper(), target_url, status_code, time.perf_counter() - start, size)
+
+def _http_request(target_url, method, stream, max_bytes, timeout, polite, **kwargs):
+    if not polite:
+        return _send_request(target_url, method, stream, max_bytes, timeout, **kwargs)
+
+    parts = urlparse(target_url)
+    host = parts.netloc
+    # The first request to a host reads its robots.txt, so Crawl-delay and Request-rate hold for every
+    # entry point (single audits, CLI batches, crawls), not just crawls.
+    if parts.path != '/robots.txt':
+        robots_cache.parser(target_url)
+    host_scheduler.acquire(host)
+    start = time.perf_counter()
+    response = error = None
+    try:
+        response = _send_request(target_url, method, stream, max_bytes, timeout, **kwargs)
+        return response
+    except requests.RequestException as e:
+        error = e
+        raise
+    finally:
+        host_scheduler.release(host, response, time.perf_counter() - start,
+                               failed=isinstance(error, (requests.ConnectionError, requests.Timeout)))
+
+def _send_request(target_url, method, stream, max_bytes, timeout, **kwargs):
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if method.upper() == 'HEAD':
+        return http_session.head(target_url, timeout=timeout, allow_redirects=True, **kwargs)
+
+    response = http_session.get(target_url, timeout=timeout, stream=True, **kwargs)
+    if stream:
+        return response
+    try:
+        content_length = response.headers.get('Content-Length')
+        if max_bytes and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ResponseTooLarge(f"Response from {target_url} is {content_length} bytes, over the {max_bytes} byte limit")
+        body = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            body.extend(chunk)
+            if max_bytes and len(body) > max_bytes:
+                raise ResponseTooLarge(f"Response from {target_url} exceeded the {max_bytes} byte limit")
+        response._content = bytes(body)
+    finally:
+        response.close()
+    return response
+
+class RobotsCache:
+    # One parsed robots.txt per origin, fetched once on first use even when many threads ask at the same time.
+    def __init__(self, max_origins=ROBOTS_CACHE_MAX_ORIGINS):
+        self.max_origins = max_origins
+        self._parsers = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def parser(self, target_url):
+        parts = urlparse(target_url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            parser = self._parsers.get(origin)
+            if parser is not None:
+                return parser
+            origin_lock = self._loading.setdefault(origin, threading.Lock())
+        with origin_lock:
+            with self._lock:
+                parser = self._parsers.get(origin)
+            if parser is None:
+                parser = self._fetch(origin, parts.netloc)
+                with self._lock:
+                    self._parsers[origin] = parser
+                    self._loading.pop(origin, None)
+                    # Oldest first: a long-lived process forgets hosts it has not met in a while.
+                    while len(self._parsers) > self.max_origins:
+                        self._parsers.pop(next(iter(self._parsers)))
+        return parser
+
+    def _fetch(self, origin, host):
+        parser = RobotFileParser(origin + "/robots.txt")
+        try:
+            response = http_request(origin + "/robots.txt")
+            if response.status_code >= 500:
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+                self._apply_crawl_delay(host, parser)
+        except requests.RequestException:
+            parser.allow_all = True
+        return parser
+
+    @staticmethod
+    def _apply_crawl_delay(host, parser):
+        # Crawl-delay, or a Request-rate turned into a delay, spaces out every request to the host.
+        delay = parser.crawl_delay(HEADERS["User-Agent"])
+        rate = parser.request_rate(HEADERS["User-Agent"])
+        if delay is None and rate is not None and rate.requests:
+            delay = rate.seconds / rate.requests
+        if delay:
+            host_scheduler.set_crawl_delay(host, delay)
+
+    def allowed(self, target_url):
+        return self.parser(target_url).can_fetch(HEADERS["User-Agent"], target_url)
+
+robots_cache = RobotsCache()
+
+def request_url(url, headers=None):
+    with tracer.span("request_url", url=url):
+        return _request_url(url, headers)
+
+def _request_url(url, headers):
+    try:
+        response = http_request(url, headers=headers)
+        response.raise_for_status()
+        return response
+    except requests.RequestException as e:
+        logger.error(f"Error fetching URL: {e}")
+        return None
+
+def safe_request_url(target_url, method='GET'):
+    with tracer.span("safe_request_url", url=target_url, method=method):
+        return _safe_request_url(target_url, method)
+
+def _safe_request_url(target_url, method):
+    try:
+        response = http_request(target_url, method=method)
+        response.raise_for_status()
+        return response
+    except requests.RequestException as e:
+        logger.warning(f"Error fetching URL: {e}")
+        return None
+
+def normalize_url(target_url):
+    parts = urlparse(target_url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    return urlunparse((scheme, netloc, parts.path or '/', parts.params, parts.query, ''))
+
+class URLStatus(namedtuple('URLStatus', ['url', 'status_code', 'final_url', 'size', 'error', 'etag', 'last_modified'],
+                           defaults=(None, None))):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status_code is not None and self.status_code < 400
+
+    @property
+    def throttled(self):
+        # The server turned the check away (429/503), so the link was not actually checked.
+        return self.status_code in THROTTLE_STATUSES
+
+    @property
+    def broken(self):
+        return not self.ok and not self.throttled
+
+def conditional_headers(etag, last_modified):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+def request_after_throttle(target_url, **kwargs):
+    # http_request, sent again after a 429/503. host_scheduler has paused the host by then, so the
+    # repeat waits for the pause to end instead of asking again straight away.
+    for _ in range(HTTP_THROTTLE_RECHECKS):
+        response = http_request(target_url, **kwargs)
+        if response.status_code not in THROTTLE_STATUSES:
+            return response
+        response.close()
+    return http_request(target_url, **kwargs)
+
+def check_url_status(target_url, previous=None):
+    # HEAD first; fall back to GET when the server rejects HEAD.
+    # With a previous status that carried validators the HEAD is conditional, and a 304 reuses it.
+    try:
+        headers = conditional_headers(previous.etag, previous.last_modified) if previous and previous.ok else {}
+        response = request_after_throttle(target_url, method='HEAD', headers=headers)
+        if headers and response.status_code == 304:
+            return previous._replace(url=target_url)
+        # A HEAD that is still throttled has used up its re-checks; a GET would only be throttled again.
+        if response.status_code >= 400 and response.status_code not in THROTTLE_STATUSES:
+            response = http_request(target_url, stream=True)
+            response.close()
+        size = response.headers.get('Content-Length')
+        return URLStatus(target_url, response.status_code, response.url, int(size) if size and size.isdigit() else None, None,
+                         response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    except requests.RequestException as e:
+        return URLStatus(target_url, None, None, None, str(e))
+
+def _read_raw(response, limit):
+    # Body bytes as sent, before requests would undo the Content-Encoding.
+    data = bytearray()
+    while len(data) < limit:
+        chunk = response.raw.read(min(64 * 1024, limit - len(data)), decode_content=False)
+        if not chunk:
+            break
+        data.extend(chunk)
+    return bytes(data)
+
+def probe_asset(target_url, image=False, previous=None):
+    # A ranged GET for the first few KB (IMAGE_PROBE_BYTES or ASSET_PROBE_BYTES). The transferred size comes from Content-Range, or
+    # from Content-Length when the server ignores the range. Only a body with neither is read to the
+    # end, and only to count it. JPEG headers that sit deeper are fetched up to IMAGE_HEADER_MAX_BYTES.
+    # As with check_url_status, a previous AssetInfo with validators makes the GET conditional and a 304 reuses it.
+    try:
+        probe_bytes = IMAGE_PROBE_BYTES if image else ASSET_PROBE_BYTES
+        validators = conditional_headers(previous.etag, previous.last_modified) if previous and previous.ok else {}
+        response = request_after_throttle(target_url, stream=True, max_bytes=IMAGE_HEADER_MAX_BYTES if image else probe_bytes,
+                                          headers={'Range': f'bytes=0-{probe_bytes - 1}', **validators})
+        try:
+            if validators and response.status_code == 304:
+                return previous._replace(url=target_url)
+            if response.status_code == 416:
+                # Nothing to range over: an empty file. Let a plain status check report it.
+                status = check_url_status(target_url)
+                return AssetInfo(target_url, status.status_code, status.final_url, None, 0, None, None, None, None, None,
+                                 status.etag, status.last_modified, status.error)
+            headers = response.headers
+            if response.status_code >= 400:
+                return AssetInfo(target_url, response.status_code, response.url, headers.get('Content-Type'), None, None,
+                                 None, None, None, None, None, None, None)
+            encoding = headers.get('Content-Encoding', '').strip().lower() or None
+            if response.status_code == 206:
+                transfer_size = parse_content_range(headers.get('Content-Range'))
+            else:
+                length = headers.get('Content-Length')
+                transfer_size = int(length) if length and length.isdigit() else None
+            data = _read_raw(response, probe_bytes)
+            if image and response.status_code != 206 and jpeg_header_incomplete(data):
+                data += _read_raw(response, IMAGE_HEADER_MAX_BYTES - len(data))
+            if transfer_size is None and response.status_code != 206:
+                transfer_size = len(data) + len(_read_raw(response, HTTP_MAX_RESPONSE_BYTES))
+        finally:
+            response.close()
+
+        if image and response.status_code == 206 and jpeg_header_incomplete(data) and (transfer_size or 0) > len(data):
+            more = http_request(target_url, stream=True, max_bytes=IMAGE_HEADER_MAX_BYTES,
+                                headers={'Range': f'bytes={len(data)}-{IMAGE_HEADER_MAX_BYTES - 1}'})
+            try:
+                if more.status_code == 206:
+                    data += _read_raw(more, IMAGE_HEADER_MAX_BYTES - len(data))
+            finally:
+                more.close()
+
+        sample = decode_prefix(data, encoding)
+        if image:
+            image_format, width, height = image_info(sample or b'', headers.get('Content-Type'))
+            minified = None
+        else:
+            image_format = width = height = None
+            minified = looks_minified(urlparse(response.url).path, sample)
+        return AssetInfo(target_url, response.status_code, response.url,
+                         headers.get('Content-Type'), transfer_size, encoding, image_format, width, height, minified,
+                         headers.get('ETag'), headers.get('Last-Modified'), None)
+    except requests.RequestException as e:
+        return AssetInfo(target_url, None, None, None, None, None, None, None, None, None, None, None, str(e))
+
+class URLChecker:
+    # Checks every URL found on a page once, concurrently. Per-host limits come from the shared
+    # host scheduler, so they also hold across checkers, pages and audits.
+    # previous_status, if given, maps a normalized URL to its URLStatus from an earlier audit (or None);
+    # previous_probe likewise maps a normalized URL and the image flag to its earlier AssetInfo.
+    def __init__(self, max_workers=16, previous_status=None, previous_probe=None):
+        self.max_workers = max_workers
+        self.previous_status = previous_status
+        self.previous_probe = previous_probe
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _check(self, target_url):
+        previous = self.previous_status(target_url) if self.previous_status else None
+        return check_url_status(target_url, previous)
+
+    def _probe(self, target_url, image):
+        previous = self.previous_probe(target_url, image) if self.previous_probe else None
+        return probe_asset(target_url, image, previous)
+
+    def _submit(self, key, func, *args):
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                future = self._futures[key] = self._executor.submit(func, *args)
+        return future
+
+    def submit(self, target_url):
+        key = normalize_url(target_url)
+        return self._submit((key, 'status'), self._check, key)
+
+    def submit_probe(self, target_url, image=False):
+        # Probes give an AssetInfo rather than a URLStatus; see probe_asset.
+        key = normalize_url(target_url)
+        return self._submit((key, 'image' if image else 'asset'), self._probe, key, image)
+
+    def check(self, urls):
+        futures = {target_url: self.submit(target_url) for target_url in urls}
+        return {target_url: future.result() for target_url, future in futures.items()}
+
+    def probe(self, urls, image=False):
+        futures = {target_url: self.submit_probe(target_url, image) for target_url in urls}
+        return {target_url: future.result() for target_url, future in futures.items()}
+
+    def statuses(self):
+        with self._lock:
+            futures = [future for (_, kind), future in self._futures.items() if kind == 'status']
+        return [future.result() for future in futures if future.done() and not future.exception()]
+
+    def probes(self):
+        # (image, AssetInfo) for every finished probe.
+        with self._lock:
+            futures = [(kind == 'image', future) for (_, kind), future in self._futures.items() if kind != 'status']
+        return [(image, future.result()) for image, future in futures if future.done() and not future.exception()]
+
+class PageSnapshot:
+    # One fetch and one parse of the audited page, shared by every audit. A 304 response from a
+    # conditional fetch comes with the stored body as text.
+    def __init__(self, url, response, checker=None, text=None):
+        self.url = url
+        self.response = response
+        self.final_url = response.url
+        self.history = response.history
+        self.headers = response.headers
+        self.status_code = response.status_code
+        self.not_modified = response.status_code == 304
+        self.text = response.text if text is None else text
+        self.facts = extract_page_facts(self.text)
+        # Crawls pass one site-wide checker so a link target is only checked once across pages.
+        self.checker = checker or URLChecker()
+
+def fetch_page(url):
+    response = request_url(url)
+    if not response:
+        return None
+    return PageSnapshot(url, response)
+
+def get_page(page):
+    # Audits accept either a PageSnapshot or a plain URL; URLs are fetched on demand.
+    if page is None or isinstance(page, PageSnapshot):
+        return page
+    return fetch_page(page)
@@ -0,0 +1,201 @@
+import json
+import os
+import sqlite3
+import time
+import zlib
+from collections import namedtuple
+from urllib.parse import urljoin
+
+from .audits import AUDIT_SECTIONS, crawlability_link_urls, image_urls, internal_link_urls, run_section
+from .cache import DiskCache
+from .assets import AssetInfo
+from .fetch import PageSnapshot, URLChecker, URLStatus, conditional_headers, request_url
+
+# Incremental re-audits. Every audited URL keeps its page validators and body, a fingerprint and
+# result per section and the status of every link and probe of every asset that was checked. A re-audit fetches
+# conditionally, recomputes only the sections whose fingerprint changed and diffs against the last run.
+
+AUDIT_HISTORY_PATH = os.environ.get("SEOAUDITOR_HISTORY", os.path.join(".cache", "audit_history.sqlite3"))
+# Stored results older than this are recomputed even if their inputs look unchanged, since link
+# targets can break without the page itself changing.
+REAUDIT_MAX_AGE = int(os.environ.get("SEOAUDITOR_REAUDIT_MAX_AGE", 30 * 24 * 3600))
+
+StoredPage = namedtuple('StoredPage', ['url', 'etag', 'last_modified', 'body', 'fetched_at'])
+StoredSection = namedtuple('StoredSection', ['fingerprint', 'result', 'audited_at'])
+
+class AuditHistory:
+    def __init__(self, path=AUDIT_HISTORY_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                         "body BLOB NOT NULL, fetched_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sections (url TEXT NOT NULL, section TEXT NOT NULL, fingerprint TEXT, "
+                         "result TEXT NOT NULL, audited_at REAL NOT NULL, PRIMARY KEY (url, section))")
+            conn.execute("CREATE TABLE IF NOT EXISTS url_statuses (url TEXT PRIMARY KEY, status_code INTEGER, final_url TEXT, "
+                         "size INTEGER, etag TEXT, last_modified TEXT, checked_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS asset_probes (url TEXT NOT NULL, image INTEGER NOT NULL, status_code INTEGER, "
+                         "final_url TEXT, content_type TEXT, transfer_size INTEGER, content_encoding TEXT, format TEXT, width INTEGER, "
+                         "height INTEGER, minified INTEGER, etag TEXT, last_modified TEXT, checked_at REAL NOT NULL, "
+                         "PRIMARY KEY (url, image))")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_page(self, url):
+        with self._connect() as conn:
+            row = conn.execute("SELECT etag, last_modified, body, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return StoredPage(url, row[0], row[1], zlib.decompress(row[2]).decode("utf-8"), row[3])
+
+    def get_sections(self, url):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT section, fingerprint, result, audited_at FROM sections WHERE url = ?", (url,)).fetchall()
+        return {section: StoredSection(fingerprint, json.loads(result), audited_at) for section, fingerprint, result, audited_at in rows}
+
+    def get_url_status(self, url):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status_code, final_url, size, etag, last_modified FROM url_statuses WHERE url = ?",
+                               (url,)).fetchone()
+        if row is None:
+            return None
+        return URLStatus(url, row[0], row[1], row[2], None, row[3], row[4])
+
+    def get_asset_probe(self, url, image):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status_code, final_url, content_type, transfer_size, content_encoding, format, width, height, "
+                               "minified, etag, last_modified FROM asset_probes WHERE url = ? AND image = ?",
+                               (url, int(image))).fetchone()
+        if row is None:
+            return None
+        return AssetInfo(url, *row[:8], None if row[8] is None else bool(row[8]), row[9], row[10], None)
+
+    def save(self, url, page, sections, url_statuses, asset_probes=()):
+        # sections maps a section name to a StoredSection and asset_probes holds (image, AssetInfo) pairs;
+        # everything is written in one transaction.
+        now = time.time()
+        with self._connect() as conn:
+            if page.status_code == 304:
+                conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (now, url))
+            else:
+                conn.execute("INSERT OR REPLACE INTO pages (url, etag, last_modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                             (url, page.headers.get("ETag"), page.headers.get("Last-Modified"),
+                              zlib.compress(page.text.encode("utf-8")), now))
+            conn.executemany("INSERT OR REPLACE INTO sections (url, section, fingerprint, result, audited_at) VALUES (?, ?, ?, ?, ?)",
+                             [(url, section, stored.fingerprint, json.dumps(stored.result), stored.audited_at)
+                              for section, stored in sections.items()])
+            conn.executemany("INSERT OR REPLACE INTO url_statuses (url, status_code, final_url, size, etag, last_modified, checked_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(status.url, status.status_code, status.final_url, status.size, status.etag, status.last_modified, now)
+                              for status in url_statuses if status.error is None and not status.throttled])
+            conn.executemany("INSERT OR REPLACE INTO asset_probes (url, image, status_code, final_url, content_type, transfer_size, "
+                             "content_encoding, format, width, height, minified, etag, last_modified, checked_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             [(info.url, int(image), info.status_code, info.final_url, info.content_type, info.transfer_size,
+                               info.content_encoding, info.format, info.width, info.height,
+                               None if info.minified is None else int(info.minified), info.etag, info.last_modified, now)
+                              for image, info in asset_probes if info.error is None and not info.throttled])
+
+def fetch_page_conditional(url, previous, checker=None):
+    # A 304 rebuilds the snapshot from the stored body, so the audits see the same page without downloading it.
+    headers = conditional_headers(previous.etag, previous.last_modified) if previous else None
+    response = request_url(url, headers=headers)
+    if not response:
+        return None
+    if response.status_code == 304:
+        return PageSnapshot(url, response, checker, text=previous.body)
+    return PageSnapshot(url, response, checker)
+
+def status_parts(statuses):
+    # What a fingerprint keeps of link checks (URLStatus) or probes (AssetInfo). With a conditional check
+    # a 304 returns the stored status unchanged, so the fingerprint only moves when a target did.
+    return sorted((status.url, status.status_code, status.etag or "", status.last_modified or "") for status in statuses)
+
+def section_fingerprint(section, page):
+    # A digest of everything a section's result depends on, or None when it must always be recomputed.
+    # Link checks and probes run here are the ones the audit makes, so a recompute reuses them.
+    facts = page.facts
+    if section == "title":
+        parts = (facts.title,)
+    elif section == "meta":
+        parts = (facts.meta_description,)
+    elif section == "h1":
+        # The title decides whether a single H1 needs a suggestion.
+        parts = (facts.h1s, facts.title)
+    elif section == "images":
+        # Alt texts are scored against the title and H1s, and an empty alt differs from a missing one.
+        # The probes decide which images are broken or oversized.
+        infos = page.checker.probe(image_urls(page), image=True).values()
+        parts = (page.url, facts.title, facts.h1s, sorted({(image.src, image.alt is None, image.alt or "", image.width or "",
+                                                            image.decorative) for image in facts.images}),
+                 status_parts(infos), sorted((info.url, info.transfer_size or 0, info.width or 0, info.height or 0) for info in infos))
+    elif section == "linking":
+        parts = (page.url, sorted({link.href for link in facts.main_content_links}),
+                 status_parts(page.checker.check(internal_link_urls(page)).values()))
+    elif section == "anchors":
+        parts = (page.url, [(link.text, link.href) for link in facts.main_content_links])
+    elif section == "crawlability":
+        # Asset weights feed the size check, so the probed sizes and validators are part of the fingerprint.
+        internal_links, canonical_url = crawlability_link_urls(page)
+        link_futures = [page.checker.submit(link) for link in internal_links + ([canonical_url] if canonical_url else [])]
+        assets = facts.stylesheets + facts.scripts
+        probed = page.checker.probe([urljoin(page.url, asset) for asset in assets])
+        infos = [probed[urljoin(page.url, asset)] for asset in assets]
+        parts = (page.url, facts.canonical, sorted({link.href for link in facts.links}),
+                 [(asset, info.status_code, info.transfer_size, info.content_encoding, info.etag, info.last_modified)
+                  for asset, info in zip(assets, infos)],
+                 status_parts(future.result() for future in link_futures))
+    elif section == "accessibility":
+        parts = ([(r.url, r.status_code) for r in page.history], page.final_url)
+    else:
+        # PageSpeed measures the live site (and has its own cache), so it is never reused from history.
+        return None
+    return DiskCache.make_key(section, *parts)
+
+def diff_section(before, after):
+    if before is None:
+        return {"status": "new"}
+    if before == after:
+        return {"status": "unchanged"}
+    if isinstance(before, list) and isinstance(after, list):
+        before_items = {json.dumps(item, sort_keys=True): item for item in before}
+        after_items = {json.dumps(item, sort_keys=True): item for item in after}
+        return {"status": "changed",
+                "added": [item for key, item in after_items.items() if key not in before_items],
+                "removed": [item for key, item in before_items.items() if key not in after_items]}
+    if isinstance(before, dict) and isinstance(after, dict):
+        return {"status": "changed",
+                "changed": {key: {"before": before.get(key), "after": after.get(key)}
+                            for key in sorted(set(before) | set(after)) if before.get(key) != after.get(key)}}
+    return {"status": "changed", "before": before, "after": after}
+
+def run_incremental_audit(url, history, sections=AUDIT_SECTIONS, pagespeed_api_key=None, max_age=REAUDIT_MAX_AGE):
+    # Like run_audit, plus "reused" (sections taken from history) and "diff" (per section, against the last run).
+    checker = URLChecker(previous_status=history.get_url_status, previous_probe=history.get_asset_probe)
+    page = fetch_page_conditional(url, history.get_page(url), checker)
+    previous_sections = history.get_sections(url)
+    results = {"url": url, "fetched": page is not None, "not_modified": bool(page and page.not_modified),
+               "sections": {}, "reused": [], "diff": {}}
+    stored = {}
+    now = time.time()
+    for section in sections:
+        previous = previous_sections.get(section)
+        fingerprint = section_fingerprint(section, page) if page else None
+        if fingerprint is not None and previous and previous.fingerprint == fingerprint and now - previous.audited_at <= max_age:
+            result = previous.result
+            results["reused"].append(section)
+            stored[section] = previous
+        else:
+            # Round-trip through JSON so tuples compare equal to the stored lists.
+            result = json.loads(json.dumps(run_section(section, url, page, pagespeed_api_key)))
+            stored[section] = StoredSection(fingerprint, result, now)
+        results["sections"][section] = result
+        results["diff"][section] = diff_section(previous.result if previous else None, result)
+
+    # A failed fetch has nothing to fingerprint, so it leaves the last good run in place.
+    if page is not None:
+        history.save(url, page, stored, checker.statuses(), checker.probes())
+    return results
@@ -0,0 +1,227 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+# Lightweight tracing for audits, HTTP fetches and LLM calls. Everything is a no-op until the
+# tracer is enabled (tracer.enable() or SEOAUDITOR_TRACE=1), so the disabled cost is one attribute check.
+
+TRACE_BUFFER_SIZE = 100000
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {"type": "span", "name": self.name, "start": self.start,
+                  "duration": time.perf_counter() - self._perf_start, "thread": threading.current_thread().name}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attributes)
+        self.tracer.add(record)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class Tracer:
+    def __init__(self, enabled=False, buffer_size=TRACE_BUFFER_SIZE):
+        self.enabled = enabled
+        self._always = enabled
+        # How many enable() calls each owner has not yet matched with disable(); None for library callers.
+        self._owners = Counter()
+        self._records = deque(maxlen=buffer_size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    # enable() and disable() nest: tracing stays on until every enable() has had its disable(), so one
+    # app session switching it off does not stop the trace another session is recording. owner names
+    # who enabled it, so prune() can drop owners that went away without calling disable().
+    def enable(self, owner=None):
+        with self._lock:
+            self._owners[owner] += 1
+            self.enabled = True
+
+    def disable(self, owner=None):
+        with self._lock:
+            self._owners[owner] -= 1
+            self._update()
+
+    def prune(self, alive):
+        # Forgets every owner other than None for which alive(owner) is false.
+        with self._lock:
+            for owner in [owner for owner in self._owners if owner is not None and not alive(owner)]:
+                del self._owners[owner]
+            self._update()
+
+    def _update(self):
+        self._owners = +self._owners
+        self.enabled = self._always or bool(self._owners)
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+            self._count += 1
+
+    def add_records(self, records):
+        for record in records:
+            self.add(record)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def record_http(self, method, url, status_code, latency, size):
+        if self.enabled:
+            self.add({"type": "http", "method": method, "url": url, "status": status_code, "start": time.time() - latency,
+                      "duration": latency, "bytes": size, "thread": threading.current_thread().name})
+
+    def record_llm(self, model, latency, prompt_tokens, completion_tokens):
+        if self.enabled:
+            self.add({"type": "llm", "model": model, "start": time.time() - latency, "duration": latency,
+                      "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "thread": threading.current_thread().name})
+
+    def record_llm_skip(self, audit, reason, count):
+        # LLM calls an audit left out: "prefilter" for items that passed the local checks, "budget" for the rest.
+        if self.enabled and count:
+            self.add({"type": "llm_skip", "audit": audit, "reason": reason, "count": count, "start": time.time(),
+                      "thread": threading.current_thread().name})
+
+    def mark(self):
+        # An opaque position in the trace; records(since=mark) returns what was added after it.
+        with self._lock:
+            return self._count
+
+    def records(self, since=0):
+        with self._lock:
+            skip = max(0, since - (self._count - len(self._records)))
+            return list(self._records)[skip:]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._count = 0
+
+def slowest_spans(records, limit=15):
+    spans = [record for record in records if record["type"] in ("span", "http", "llm")]
+    return sorted(spans, key=lambda record: record["duration"], reverse=True)[:limit]
+
+def summarize(records):
+    summary = {"http_requests": 0, "http_bytes": 0, "http_seconds": 0.0, "llm_calls": 0,
+               "llm_prompt_tokens": 0, "llm_completion_tokens": 0, "llm_seconds": 0.0, "llm_skipped": 0}
+    for record in records:
+        if record["type"] == "http":
+            summary["http_requests"] += 1
+            summary["http_bytes"] += record["bytes"] or 0
+            summary["http_seconds"] += record["duration"]
+        elif record["type"] == "llm":
+            summary["llm_calls"] += 1
+            summary["llm_prompt_tokens"] += record["prompt_tokens"]
+            summary["llm_completion_tokens"] += record["completion_tokens"]
+            summary["llm_seconds"] += record["duration"]
+        elif record["type"] == "llm_skip":
+            summary["llm_skipped"] += record["count"]
+    return summary
+
+def to_json_lines(records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    # Running Prometheus aggregates, so long batch runs don't need to keep every trace record.
+    def __init__(self, records=()):
+        self.span_seconds = defaultdict(float)
+        self.span_count = defaultdict(int)
+        self.http_requests = defaultdict(int)
+        self.http_bytes = 0
+        self.http_seconds = 0.0
+        self.llm_tokens = defaultdict(int)
+        self.llm_requests = defaultdict(int)
+        self.llm_seconds = 0.0
+        self.llm_skipped = defaultdict(int)
+        self.add_records(records)
+
+    def add_records(self, records):
+        for record in records:
+            if record["type"] == "span":
+                self.span_seconds[record["name"]] += record["duration"]
+                self.span_count[record["name"]] += 1
+            elif record["type"] == "http":
+                self.http_requests[(record["method"], record["status"])] += 1
+                self.http_bytes += record["bytes"] or 0
+                self.http_seconds += record["duration"]
+            elif record["type"] == "llm":
+                self.llm_requests[record["model"]] += 1
+                self.llm_tokens[(record["model"], "prompt")] += record["prompt_tokens"]
+                self.llm_tokens[(record["model"], "completion")] += record["completion_tokens"]
+                self.llm_seconds += record["duration"]
+            elif record["type"] == "llm_skip":
+                self.llm_skipped[(record["audit"], record["reason"])] += record["count"]
+
+    def to_prometheus(self):
+        lines = ["# HELP seoauditor_span_seconds Time spent in instrumented spans.", "# TYPE seoauditor_span_seconds summary"]
+        for name in sorted(self.span_seconds):
+            lines.append(f'seoauditor_span_seconds_sum{{span="{_label(name)}"}} {self.span_seconds[name]:.6f}')
+            lines.append(f'seoauditor_span_seconds_count{{span="{_label(name)}"}} {self.span_count[name]}')
+        lines += ["# HELP seoauditor_http_requests_total HTTP requests made.", "# TYPE seoauditor_http_requests_total counter"]
+        for (method, status), count in sorted(self.http_requests.items(), key=str):
+            lines.append(f'seoauditor_http_requests_total{{method="{_label(method)}",status="{_label(status)}"}} {count}')
+        lines += ["# HELP seoauditor_http_bytes_total Response body bytes received.", "# TYPE seoauditor_http_bytes_total counter",
+                  f"seoauditor_http_bytes_total {self.http_bytes}",
+                  "# HELP seoauditor_http_seconds_total Time spent waiting on HTTP requests.", "# TYPE seoauditor_http_seconds_total counter",
+                  f"seoauditor_http_seconds_total {self.http_seconds:.6f}",
+                  "# HELP seoauditor_llm_requests_total LLM API calls made.", "# TYPE seoauditor_llm_requests_total counter"]
+        for model, count in sorted(self.llm_requests.items()):
+            lines.append(f'seoauditor_llm_requests_total{{model="{_label(model)}"}} {count}')
+        lines += ["# HELP seoauditor_llm_tokens_total LLM tokens used.", "# TYPE seoauditor_llm_tokens_total counter"]
+        for (model, kind), count in sorted(self.llm_tokens.items()):
+            lines.append(f'seoauditor_llm_tokens_total{{model="{_label(model)}",type="{kind}"}} {count}')
+        lines += ["# HELP seoauditor_llm_seconds_total Time spent waiting on LLM calls.", "# TYPE seoauditor_llm_seconds_total counter",
+                  f"seoauditor_llm_seconds_total {self.llm_seconds:.6f}",
+                  "# HELP seoauditor_llm_skipped_total LLM calls left out by the local pre-filter or the token budget.",
+                  "# TYPE seoauditor_llm_skipped_total counter"]
+        for (audit, reason), count in sorted(self.llm_skipped.items()):
+            lines.append(f'seoauditor_llm_skipped_total{{audit="{_label(audit)}",reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+def to_prometheus(records):
+    return Metrics(records).to_prometheus()
+
+tracer = Tracer(enabled=os.environ.get("SEOAUDITOR_TRACE", "") not in ("", "0"))
+
+def traced(name):
+    # Wraps an audit function in a span named after it; skipped entirely while tracing is off.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,145 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .duplicates import DuplicateDetector
+from .fetch import fetch_page, normalize_url
+from .instrument import tracer
+from .linkgraph import LinkGraph
+from .results import ResultStore, stored_crawl
+from .sitemaps import SitemapReader
+
+# Background audit jobs. They run on their own threads, so they keep going when the Streamlit
+# script that started them is interrupted by a rerun, and a later run (or another session)
+# reconnects to them through a JobStore instead of starting the audit again.
+
+JOB_STORE_MAX_JOBS = 50
+JOB_STORE_TTL = 3600
+
+class AuditJob:
+    # audits is a list of (section, func, needs_page). func(page) gets the fetched PageSnapshot (or
+    # None if the fetch failed) when needs_page is true, otherwise func(url) starts right away.
+    def __init__(self, url, audits):
+        self.url = url
+        self.audits = audits
+        self.created_at = time.time()
+        self.futures = {}
+        self.page_future = None
+        self._lock = threading.Lock()
+        self.run()
+
+    @property
+    def sections(self):
+        return [section for section, _, _ in self.audits]
+
+    def run(self, sections=None, audits=None):
+        # (Re)starts the given sections, or all of them. Sections that need the page share one fresh fetch.
+        # audits, if given, is used for this run in place of the job's own list (e.g. set up to bypass caches).
+        sections = set(sections or self.sections)
+        audits = [audit for audit in audits or self.audits if audit[0] in sections]
+        self.trace_mark = tracer.mark()
+        executor = ThreadPoolExecutor(max_workers=len(audits) + 1)
+        page_future = executor.submit(fetch_page, self.url) if any(needs_page for _, _, needs_page in audits) else None
+        with self._lock:
+            if page_future is not None:
+                self.page_future = page_future
+            for section, func, needs_page in audits:
+                if needs_page:
+                    self.futures[section] = executor.submit(self._run_with_page, func, page_future)
+                else:
+                    self.futures[section] = executor.submit(func, self.url)
+        # Already-submitted work still runs; the threads exit once it is done.
+        executor.shutdown(wait=False)
+
+    @staticmethod
+    def _run_with_page(func, page_future):
+        return func(page_future.result())
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.futures), self.page_future
+
+    @property
+    def done(self):
+        futures, page_future = self.snapshot()
+        return all(future.done() for future in futures.values()) and (page_future is None or page_future.done())
+
+class CrawlJob:
+    # Crawls on a background thread. Page findings go to a ResultStore as pages arrive, while the
+    # link graph and duplicate clusters are aggregated in memory. Without a store, each job writes
+    # to a fresh run in the default results database. With sitemap, the site's sitemap URLs are
+    # crawled as further start pages while the sitemaps download.
+    def __init__(self, url, max_pages, max_depth, store=None, sitemap=False):
+        self.url = url
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.created_at = time.time()
+        self.trace_mark = tracer.mark()
+        if store is None:
+            store = ResultStore(f"crawl-{uuid.uuid4().hex}")
+            store.prune()
+        self.store = store
+        self.pages_crawled = store.page_count()
+        self.sitemap_reader = SitemapReader(url) if sitemap else None
+        self.link_graph = LinkGraph(url)
+        self.duplicates = DuplicateDetector()
+        self.last_url = None
+        self.graph_metrics = None
+        self.duplicate_clusters = None
+        self.error = None
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"crawl {url}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            seeds = (entry.url for entry in self.sitemap_reader) if self.sitemap_reader else None
+            for result in stored_crawl(self.url, self.store, max_pages=self.max_pages, max_depth=self.max_depth, seeds=seeds):
+                self.pages_crawled += 1
+                self.link_graph.add_result(result)
+                self.duplicates.add_result(result)
+                self.last_url = result.url
+            self.graph_metrics = self.link_graph.analyze()
+            self.duplicate_clusters = self.duplicates.clusters()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.store.flush()
+            self._finished.set()
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+class JobStore:
+    # Jobs shared across sessions, keyed by normalized URL and audit options. Finished jobs expire
+    # after ttl seconds and the oldest finished ones are dropped past max_jobs; running jobs are kept.
+    def __init__(self, max_jobs=JOB_STORE_MAX_JOBS, ttl=JOB_STORE_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url, **options):
+        return (normalize_url(url.strip()), tuple(sorted(options.items())))
+
+    def get_or_start(self, key, factory, restart=False):
+        # One lock around lookup and start, so two sessions asking at once share a single job.
+        with self._lock:
+            self._evict()
+            job = None if restart else self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = factory()
+            return job
+
+    def _evict(self):
+        now = time.time()
+        finished = sorted((job.created_at, key) for key, job in self._jobs.items() if job.done)
+        for created_at, key in finished:
+            if now - created_at > self.ttl or len(self._jobs) > self.max_jobs:
+                del self._jobs[key]
@@ -0,0 +1,168 @@
+from array import array
+from urllib.parse import urlparse
+
+import numpy as np
+
+from .fetch import normalize_url
+
+# Site-wide internal link graph built from crawl results. URLs are interned to integer IDs as pages
+# arrive and edges are kept in flat arrays, then frozen into CSR form (indptr/indices) so depth,
+# degree and PageRank are computed over whole arrays instead of per-URL dicts.
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+
+class LinkGraph:
+    def __init__(self, root_url):
+        self.root_url = normalize_url(root_url)
+        self.host = urlparse(self.root_url).netloc
+        # Normalized URLs have a lowercase scheme and host and at least a "/" path, so a prefix test is enough.
+        self._prefixes = (f"http://{self.host}/", f"https://{self.host}/")
+        self.urls = []
+        self._ids = {}
+        self._crawled = bytearray()
+        self._sources = array('i')
+        self._targets = array('i')
+        self._chrome = array('b')
+        self.page_id(self.root_url)
+
+    def page_id(self, url):
+        page_id = self._ids.get(url)
+        if page_id is None:
+            page_id = self._ids[url] = len(self.urls)
+            self.urls.append(url)
+            self._crawled.append(0)
+        return page_id
+
+    def add_page(self, url, links=()):
+        # links are (normalized URL, in_chrome) pairs. Repeated links to one target count as a single
+        # edge, which only counts as chrome if every occurrence was in header/nav/footer.
+        source = self.page_id(url)
+        self._crawled[source] = 1
+        targets = {}
+        for target_url, in_chrome in links:
+            target = self._ids.get(target_url)
+            if target is None:
+                if not target_url.startswith(self._prefixes):
+                    continue
+                target = self.page_id(target_url)
+            if target != source:
+                targets[target] = targets.get(target, True) and bool(in_chrome)
+        self._sources.extend([source] * len(targets))
+        self._targets.extend(targets.keys())
+        self._chrome.extend(targets.values())
+
+    def add_result(self, result):
+        # Pages that failed or are not HTML stay in the graph as nodes without outgoing links.
+        if result.is_html and not result.error:
+            self.add_page(result.url, result.links)
+        else:
+            self.page_id(result.url)
+
+    @property
+    def edge_count(self):
+        return len(self._sources)
+
+    def analyze(self, damping=PAGERANK_DAMPING, tolerance=PAGERANK_TOLERANCE, max_iterations=PAGERANK_MAX_ITERATIONS):
+        n = len(self.urls)
+        sources = np.frombuffer(self._sources, dtype=np.int32) if self._sources else np.zeros(0, dtype=np.int32)
+        targets = np.frombuffer(self._targets, dtype=np.int32) if self._targets else np.zeros(0, dtype=np.int32)
+        chrome = np.frombuffer(self._chrome, dtype=np.int8).astype(bool) if self._chrome else np.zeros(0, dtype=bool)
+
+        order = np.argsort(sources, kind='stable')
+        out_degree = np.bincount(sources, minlength=n)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(out_degree, out=indptr[1:])
+        indices = targets[order]
+
+        in_degree = np.bincount(targets, minlength=n)
+        content_in_degree = np.bincount(targets[~chrome], minlength=n)
+        depth = click_depths(indptr, indices, self._ids[self.root_url])
+        pagerank = compute_pagerank(indptr, indices, out_degree, damping, tolerance, max_iterations)
+        crawled = np.frombuffer(bytes(self._crawled), dtype=np.uint8).astype(bool)
+        return LinkGraphMetrics(self.urls, self._ids, self._ids[self.root_url], crawled,
+                                in_degree, out_degree, content_in_degree, depth, pagerank)
+
+def click_depths(indptr, indices, root):
+    # Level-synchronous BFS: each step gathers the neighbours of the whole frontier at once.
+    n = len(indptr) - 1
+    depth = np.full(n, -1, dtype=np.int32)
+    depth[root] = 0
+    frontier = np.array([root], dtype=np.int64)
+    level = 0
+    while frontier.size:
+        starts = indptr[frontier]
+        lengths = indptr[frontier + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            break
+        # Positions starts[i] .. starts[i] + lengths[i] for every frontier node, without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        neighbours = np.unique(indices[offsets])
+        frontier = neighbours[depth[neighbours] < 0]
+        level += 1
+        depth[frontier] = level
+    return depth
+
+def compute_pagerank(indptr, indices, out_degree, damping, tolerance, max_iterations):
+    n = len(out_degree)
+    if n == 0:
+        return np.zeros(0)
+    edge_sources = np.repeat(np.arange(n, dtype=np.int32), out_degree)
+    dangling = out_degree == 0
+    inverse_degree = np.zeros(n)
+    inverse_degree[~dangling] = 1.0 / out_degree[~dangling]
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iterations):
+        # Dangling pages spread their rank evenly across the site, as if they linked everywhere.
+        spread = (1.0 - damping) / n + damping * rank[dangling].sum() / n
+        new_rank = spread + damping * np.bincount(indices, weights=(rank * inverse_degree)[edge_sources], minlength=n)
+        converged = np.abs(new_rank - rank).sum() < tolerance
+        rank = new_rank
+        if converged:
+            break
+    return rank
+
+class LinkGraphMetrics:
+    # Per-page arrays indexed by page ID; urls[i] is the page with ID i.
+    def __init__(self, urls, ids, root, crawled, in_degree, out_degree, content_in_degree, depth, pagerank):
+        self.urls = urls
+        self.ids = ids
+        self.root = root
+        self.crawled = crawled
+        self.in_degree = in_degree
+        self.out_degree = out_degree
+        self.content_in_degree = content_in_degree
+        self.depth = depth
+        self.pagerank = pagerank
+
+    def _urls(self, mask):
+        return [self.urls[i] for i in np.flatnonzero(mask)]
+
+    def orphans(self):
+        # Crawled pages no other crawled page links to.
+        mask = self.crawled & (self.in_degree == 0)
+        mask[self.root] = False
+        return self._urls(mask)
+
+    def unreachable(self):
+        # Crawled pages with no link path from the root, e.g. reachable only from orphans.
+        return self._urls(self.crawled & (self.depth < 0))
+
+    def deep_pages(self, min_depth=4):
+        return [(self.urls[i], int(self.depth[i])) for i in np.flatnonzero(self.crawled & (self.depth >= min_depth))]
+
+    def nav_only(self):
+        # Pages whose every inlink sits in header, nav or footer chrome.
+        return self._urls(self.crawled & (self.in_degree > 0) & (self.content_in_degree == 0))
+
+    def top_pagerank(self, limit=20):
+        candidates = np.flatnonzero(self.crawled)
+        ranked = candidates[np.argsort(-self.pagerank[candidates], kind='stable')][:limit]
+        return [(self.urls[i], float(self.pagerank[i])) for i in ranked]
+
+    def page(self, url):
+        i = self.ids[url]
+        return {"url": url, "depth": int(self.depth[i]), "in_degree": int(self.in_degree[i]), "out_degree": int(self.out_degree[i]),
+                "content_in_degree": int(self.content_in_degree[i]), "pagerank": float(self.pagerank[i])}
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from .cache import DiskCache
+from .instrument import traced, tracer
+from .ratelimit import RateLimiter
+
+# Try to import error classes from the new location; fall back if not available.
+try:
+    from openai.error import APIError, APIConnectionError, RateLimitError, OpenAIError
+except ModuleNotFoundError:
+    # If the error module isn’t found, use the base Exception for all error types.
+    APIError = APIConnectionError = RateLimitError = OpenAIError = Exception
+
+logger = logging.getLogger(__name__)
+
+GPT_MODEL = "gpt-4o-mini"  # Use GPT-4o mini model
+GPT_SYSTEM_PROMPT = "You are an SEO expert."
+
+# Suggestion pipeline limits; keep these under the account's OpenAI rate limits.
+LLM_BATCH_SIZE = 20
+LLM_MAX_WORKERS = 4
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("SEOAUDITOR_LLM_RPM", 500))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("SEOAUDITOR_LLM_TPM", 200000))
+LLM_MAX_RETRIES = 5
+# Output allowance per answer in a batched request.
+LLM_ANSWER_TOKENS = 150
+# Estimated tokens one audit of one page may spend on uncached prompts; the rest are skipped.
+LLM_AUDIT_TOKEN_BUDGET = int(os.environ.get("SEOAUDITOR_LLM_AUDIT_TOKENS", 6000))
+BUDGET_SKIPPED_SUGGESTION = "No suggestion generated: this audit reached its LLM token budget."
+
+gpt_rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+
+def configure_llm(requests_per_minute=None, tokens_per_minute=None):
+    # Worker processes each get a share of the account's limits so a process pool stays under them.
+    global gpt_rate_limiter
+    gpt_rate_limiter = RateLimiter(requests_per_minute or LLM_REQUESTS_PER_MINUTE, tokens_per_minute or LLM_TOKENS_PER_MINUTE)
+
+# Persistent GPT response cache shared by every session and worker process on this machine.
+LLM_CACHE_PATH = os.environ.get("SEOAUDITOR_LLM_CACHE", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = 30 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+gpt_cache = DiskCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES)
+
+def estimate_tokens(text):
+    # Rough OpenAI heuristic of four characters per token.
+    return len(text) // 4 + 1
+
+def create_chat_completion(messages, max_output_tokens=1000, **kwargs):
+    tokens = sum(estimate_tokens(m["content"]) for m in messages) + max_output_tokens
+    for attempt in range(LLM_MAX_RETRIES):
+        # Every attempt counts against the limits, retries included.
+        gpt_rate_limiter.acquire(tokens)
+        try:
+            start = time.perf_counter()
+            response = openai.ChatCompletion.create(model=GPT_MODEL, messages=messages, **kwargs)
+            if tracer.enabled:
+                usage = response.get("usage") or {}
+                tracer.record_llm(GPT_MODEL, time.perf_counter() - start, usage.get("prompt_tokens", 0),
+                                  usage.get("completion_tokens", 0))
+            return response
+        except RateLimitError:
+            if attempt == LLM_MAX_RETRIES - 1:
+                raise
+            time.sleep(min(60, 2 ** attempt) + random.uniform(0, 1))
+
+def report_gpt_error(e):
+    if isinstance(e, RateLimitError):
+        logger.error(f"OpenAI API request exceeded rate limit: {e}")
+    elif isinstance(e, APIConnectionError):
+        logger.error(f"Failed to connect to OpenAI API: {e}")
+    elif isinstance(e, APIError):
+        logger.error(f"OpenAI API returned an API Error: {e}")
+    else:
+        logger.error(f"OpenAI API error: {e}")
+
+@traced("get_gpt_insights")
+def get_gpt_insights(prompt):
+    cached = gpt_cache.get(GPT_MODEL, GPT_SYSTEM_PROMPT, prompt)
+    if cached is not None:
+        return cached
+    try:
+        response = create_chat_completion([
+            {"role": "system", "content": GPT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ])
+        content = response["choices"][0]["message"]["content"].strip()
+        if content:
+            gpt_cache.set(GPT_MODEL, GPT_SYSTEM_PROMPT, prompt, content)
+        return content
+    except OpenAIError as e:
+        report_gpt_error(e)
+        return ""
+
+def _gpt_batch(prompts):
+    # One structured request answering several prompts, keyed by their position in the batch.
+    if len(prompts) == 1:
+        response = create_chat_completion([
+            {"role": "system", "content": GPT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompts[0]}
+        ])
+        return {prompts[0]: response["choices"][0]["message"]["content"].strip()}
+
+    response = create_chat_completion([
+        {"role": "system", "content": GPT_SYSTEM_PROMPT + " Answer each request in the JSON object independently. "
+                                      "Reply with a JSON object mapping every request id to a short plain-text answer."},
+        {"role": "user", "content": json.dumps({str(i): prompt for i, prompt in enumerate(prompts)})}
+    ], max_output_tokens=LLM_ANSWER_TOKENS * len(prompts), response_format={"type": "json_object"})
+    content = response["choices"][0]["message"]["content"].strip()
+    try:
+        answers = json.loads(content)
+    except ValueError:
+        answers = {}
+    return {prompt: str(answers[str(i)]).strip() for i, prompt in enumerate(prompts) if str(i) in answers}
+
+@traced("get_gpt_insights_batch")
+def get_gpt_insights_batch(prompts, audit=None, token_budget=None):
+    # Deduplicates prompts, sends the uncached ones in batches concurrently and returns {prompt: suggestion}.
+    # With a token_budget, uncached prompts are sent in order until their estimated cost reaches it; the
+    # rest are recorded as skipped for audit and left out of the result.
+    unique_prompts = list(dict.fromkeys(prompts))
+    results = {}
+    for prompt in unique_prompts:
+        cached = gpt_cache.get(GPT_MODEL, GPT_SYSTEM_PROMPT, prompt)
+        if cached is not None:
+            results[prompt] = cached
+    pending = [prompt for prompt in unique_prompts if prompt not in results]
+    over_budget = set()
+    if token_budget is not None:
+        for prompt in pending:
+            token_budget -= estimate_tokens(prompt) + LLM_ANSWER_TOKENS
+            if token_budget < 0:
+                over_budget.add(prompt)
+        if over_budget:
+            pending = [prompt for prompt in pending if prompt not in over_budget]
+            logger.info(f"{audit}: skipped {len(over_budget)} LLM prompts over the token budget")
+            tracer.record_llm_skip(audit, "budget", len(over_budget))
+    batches = [pending[i:i + LLM_BATCH_SIZE] for i in range(0, len(pending), LLM_BATCH_SIZE)]
+    errors = []
+
+    def run(batch):
+        try:
+            answered = _gpt_batch(batch)
+            # Anything the model dropped from a batch is retried on its own.
+            for prompt in batch:
+                if prompt not in answered and len(batch) > 1:
+                    answered.update(_gpt_batch([prompt]))
+            return answered
+        except OpenAIError as e:
+            errors.append(e)
+            return {}
+
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(LLM_MAX_WORKERS, len(batches))) as executor:
+            for answered in executor.map(run, batches):
+                results.update(answered)
+                for prompt, content in answered.items():
+                    if content:
+                        gpt_cache.set(GPT_MODEL, GPT_SYSTEM_PROMPT, prompt, content)
+
+    # Errors are reported once, from the calling thread.
+    if errors:
+        report_gpt_error(errors[0])
+    return {prompt: results.get(prompt, "") for prompt in unique_prompts if prompt not in over_budget}
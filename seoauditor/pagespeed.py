@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .cache import DiskCache
+from .fetch import HTTP_CONNECT_TIMEOUT, http_request, normalize_url
+from .instrument import traced
+from .ratelimit import RateLimiter
+
+PAGESPEED_API_ENDPOINT = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+PAGESPEED_STRATEGIES = ("mobile", "desktop")
+# Lighthouse runs take a while server-side, so PageSpeed gets a longer read timeout.
+PAGESPEED_READ_TIMEOUT = 120
+# The API allows a limited number of queries per minute per key; batch and crawl runs share this budget.
+PAGESPEED_REQUESTS_PER_MINUTE = int(os.environ.get("SEOAUDITOR_PAGESPEED_RPM", "240"))
+PAGESPEED_MAX_CONCURRENT = 4
+
+PAGESPEED_CACHE_PATH = os.environ.get("SEOAUDITOR_PAGESPEED_CACHE", os.path.join(".cache", "pagespeed_cache.sqlite3"))
+PAGESPEED_CACHE_TTL = int(os.environ.get("SEOAUDITOR_PAGESPEED_CACHE_TTL", str(24 * 3600)))
+PAGESPEED_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+class PageSpeedError(requests.RequestException):
+    pass
+
+class PageSpeedScheduler:
+    # Keeps PageSpeed calls under the per-minute quota and a cap on in-flight requests.
+    def __init__(self, requests_per_minute=PAGESPEED_REQUESTS_PER_MINUTE, max_concurrent=PAGESPEED_MAX_CONCURRENT):
+        self.limiter = RateLimiter(requests_per_minute)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent * len(PAGESPEED_STRATEGIES))
+
+    def run(self, func, *args):
+        with self._slots:
+            self.limiter.acquire()
+            return func(*args)
+
+pagespeed_cache = DiskCache(PAGESPEED_CACHE_PATH, ttl=PAGESPEED_CACHE_TTL, max_bytes=PAGESPEED_CACHE_MAX_BYTES)
+pagespeed_scheduler = PageSpeedScheduler()
+
+def configure_pagespeed(requests_per_minute=None, max_concurrent=PAGESPEED_MAX_CONCURRENT):
+    # Worker processes each get a share of the quota so a process pool stays under the key's limit.
+    global pagespeed_scheduler
+    pagespeed_scheduler = PageSpeedScheduler(requests_per_minute or PAGESPEED_REQUESTS_PER_MINUTE, max_concurrent)
+
+def _fetch_pagespeed(url, api_key, strategy):
+    params = {
+        "url": url,
+        "key": api_key,
+        "strategy": strategy
+    }
+    response = http_request(PAGESPEED_API_ENDPOINT, params=params, timeout=(HTTP_CONNECT_TIMEOUT, PAGESPEED_READ_TIMEOUT),
+                            polite=False)
+    if response.status_code >= 400:
+        try:
+            message = response.json()["error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            message = response.reason
+        raise PageSpeedError(f"PageSpeed API returned {response.status_code} for {strategy}: {message}", response=response)
+    return response.json()
+
+@traced("get_pagespeed_insights")
+def get_pagespeed_insights(url, api_key=None, strategy="mobile", use_cache=True):
+    api_key = api_key or os.environ.get("PAGESPEED_API_KEY")
+    cache_key = (normalize_url(url), strategy)
+    if use_cache:
+        cached = pagespeed_cache.get(*cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
+    data = pagespeed_scheduler.run(_fetch_pagespeed, url, api_key, strategy)
+    if use_cache:
+        pagespeed_cache.set(*cache_key, json.dumps(data))
+    return data
+
+def start_pagespeed_reports(url, api_key=None, strategies=PAGESPEED_STRATEGIES, use_cache=True):
+    # Starts every strategy in the background and returns {strategy: Future}.
+    return {strategy: pagespeed_scheduler.executor.submit(get_pagespeed_insights, url, api_key, strategy, use_cache)
+            for strategy in strategies}
+
+def get_pagespeed_reports(url, api_key=None, strategies=PAGESPEED_STRATEGIES, use_cache=True, futures=None):
+    # Mobile and desktop run in parallel. A failed strategy maps to {"error": message} so the
+    # other strategy's report is still usable.
+    futures = futures or start_pagespeed_reports(url, api_key, strategies, use_cache)
+    reports = {}
+    for strategy, future in futures.items():
+        try:
+            reports[strategy] = future.result()
+        except (requests.RequestException, ValueError) as e:
+            reports[strategy] = {"error": str(e)}
+    return reports
+
+def analyze_pagespeed_data(data):
+    crux_metrics = {}
+    lighthouse_metrics = {}
+
+    if 'loadingExperience' in data and 'metrics' in data['loadingExperience']:
+        metrics = data['loadingExperience']['metrics']
+        if 'FIRST_CONTENTFUL_PAINT_MS' in metrics:
+            crux_metrics['First Contentful Paint'] = metrics['FIRST_CONTENTFUL_PAINT_MS']['category']
+        if 'FIRST_INPUT_DELAY_MS' in metrics:
+            crux_metrics['First Input Delay'] = metrics['FIRST_INPUT_DELAY_MS']['category']
+
+    if 'lighthouseResult' in data and 'audits' in data['lighthouseResult']:
+        audits = data['lighthouseResult']['audits']
+        
+        lighthouse_keys = {
+            'First Contentful Paint': 'first-contentful-paint',
+            'Speed Index': 'speed-index',
+            'Time To Interactive': 'interactive',
+            'First Meaningful Paint': 'first-meaningful-paint',
+            'First CPU Idle': 'first-cpu-idle',
+            'Estimated Input Latency': 'estimated-input-latency'
+        }
+        
+        for display_key, audit_key in lighthouse_keys.items():
+            if audit_key in audits and 'displayValue' in audits[audit_key]:
+                lighthouse_metrics[display_key] = audits[audit_key]['displayValue']
+
+    return crux_metrics, lighthouse_metrics
@@ -0,0 +1,165 @@
+import email.utils
+import os
+import threading
+import time
+
+# Per-host politeness for everything fetched from audited sites. Each host gets its own concurrency
+# and requests-per-second limits, which grow while responses stay fast and shrink on 429/503 or
+# rising latency. Retry-After and robots.txt Crawl-delay are honoured, and the global connection
+# budget is split fairly between the hosts that currently have work.
+
+MAX_CONNECTIONS = int(os.environ.get("SEOAUDITOR_MAX_CONNECTIONS", 32))
+HOST_INITIAL_CONCURRENCY = 4
+HOST_MAX_CONCURRENCY = int(os.environ.get("SEOAUDITOR_HOST_MAX_CONCURRENCY", 8))
+HOST_INITIAL_RPS = 10.0
+HOST_MAX_RPS = float(os.environ.get("SEOAUDITOR_HOST_MAX_RPS", 25))
+HOST_MIN_RPS = 0.2
+# Pause after a 429/503 without Retry-After, doubled for each consecutive one.
+HOST_THROTTLE_BACKOFF = 5.0
+HOST_MAX_BACKOFF = 300.0
+HOST_MAX_CRAWL_DELAY = 60.0
+# A host whose recent latency climbs past this multiple of its long-run latency (and past the floor) is slowing down.
+HOST_SLOW_FACTOR = 2.0
+HOST_SLOW_FLOOR = 0.5
+THROTTLE_STATUSES = (429, 503)
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def was_throttled(response):
+    # urllib3 retries 429/503 itself, so a throttle can hide in the retry history of a final 200.
+    if response.status_code in THROTTLE_STATUSES:
+        return True
+    retries = getattr(response.raw, 'retries', None)
+    return any(attempt.status in THROTTLE_STATUSES for attempt in getattr(retries, 'history', ()))
+
+class HostState:
+    def __init__(self, concurrency, rps):
+        self.concurrency = concurrency
+        self.rps = rps
+        self.in_flight = 0
+        self.waiting = 0
+        self.next_start = 0.0
+        self.blocked_until = 0.0
+        self.crawl_delay = 0.0
+        self.latency = None
+        self.baseline_latency = None
+        self.successes = 0
+        self.throttles = 0
+
+    @property
+    def interval(self):
+        return max(1.0 / self.rps, self.crawl_delay)
+
+class HostScheduler:
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_host_concurrency=HOST_MAX_CONCURRENCY, max_host_rps=HOST_MAX_RPS):
+        self._hosts = {}
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self.configure(max_connections, max_host_concurrency, max_host_rps)
+
+    def configure(self, max_connections=MAX_CONNECTIONS, max_host_concurrency=HOST_MAX_CONCURRENCY, max_host_rps=HOST_MAX_RPS):
+        # CLI worker processes each take a share of the per-host limits so a process pool stays polite.
+        with self._condition:
+            self.max_connections = max(1, max_connections)
+            self.max_host_concurrency = max(1, max_host_concurrency)
+            self.max_host_rps = max(HOST_MIN_RPS, max_host_rps)
+            for state in self._hosts.values():
+                state.concurrency = min(state.concurrency, self.max_host_concurrency)
+                state.rps = min(state.rps, self.max_host_rps)
+            self._condition.notify_all()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(min(HOST_INITIAL_CONCURRENCY, self.max_host_concurrency),
+                                                  min(HOST_INITIAL_RPS, self.max_host_rps))
+        return state
+
+    def _fair_share(self):
+        active = sum(1 for state in self._hosts.values() if state.in_flight or state.waiting)
+        return max(1, self.max_connections // max(active, 1))
+
+    def set_crawl_delay(self, host, delay):
+        with self._condition:
+            self._host(host).crawl_delay = min(float(delay or 0), HOST_MAX_CRAWL_DELAY)
+
+    def acquire(self, host):
+        with self._condition:
+            state = self._host(host)
+            state.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    ready_at = max(state.next_start, state.blocked_until)
+                    if (now >= ready_at and state.in_flight < min(state.concurrency, self._fair_share())
+                            and self._in_flight < self.max_connections):
+                        break
+                    # Slots are freed with notify_all; time-based waits wake up on their own.
+                    self._condition.wait(timeout=min(max(ready_at - now, 0.01), 1.0))
+                state.in_flight += 1
+                self._in_flight += 1
+                state.next_start = max(now, state.next_start) + state.interval
+            finally:
+                state.waiting -= 1
+
+    def release(self, host, response=None, latency=None, failed=False):
+        # failed marks a timeout or connection error; response is None then, and for other client-side errors.
+        with self._condition:
+            state = self._hosts[host]
+            state.in_flight -= 1
+            self._in_flight -= 1
+            now = time.monotonic()
+            if response is not None and was_throttled(response):
+                state.throttles += 1
+                state.successes = 0
+                state.concurrency = max(1, state.concurrency // 2)
+                state.rps = max(HOST_MIN_RPS, state.rps / 2)
+                # When urllib3 retried its way past the throttle it has already waited, so only the limits drop.
+                if response.status_code in THROTTLE_STATUSES:
+                    delay = parse_retry_after(response.headers.get('Retry-After'))
+                    if delay is None:
+                        delay = HOST_THROTTLE_BACKOFF * 2 ** (state.throttles - 1)
+                    state.blocked_until = max(state.blocked_until, now + min(delay, HOST_MAX_BACKOFF))
+            elif failed:
+                self._slow_down(state)
+            elif response is not None:
+                state.throttles = 0
+                # A fast and a slow moving average; the slow one adapts to hosts that are simply slow.
+                if state.latency is None:
+                    state.latency = state.baseline_latency = latency
+                state.latency = 0.7 * state.latency + 0.3 * latency
+                state.baseline_latency = 0.95 * state.baseline_latency + 0.05 * latency
+                if state.latency > max(HOST_SLOW_FACTOR * state.baseline_latency, HOST_SLOW_FLOOR):
+                    self._slow_down(state)
+                else:
+                    # Additive increase: one more connection and request/second per full round of successes.
+                    state.successes += 1
+                    if state.successes >= state.concurrency:
+                        state.successes = 0
+                        state.concurrency = min(self.max_host_concurrency, state.concurrency + 1)
+                        state.rps = min(self.max_host_rps, state.rps + 1)
+            self._condition.notify_all()
+
+    def _slow_down(self, state):
+        state.successes = 0
+        state.concurrency = max(1, state.concurrency - 1)
+        state.rps = max(HOST_MIN_RPS, state.rps * 0.75)
+
+    def stats(self):
+        with self._condition:
+            return {host: {"concurrency": state.concurrency, "rps": round(state.rps, 2), "in_flight": state.in_flight,
+                           "crawl_delay": state.crawl_delay, "throttles": state.throttles,
+                           "latency": round(state.latency, 3) if state.latency is not None else None}
+                    for host, state in self._hosts.items()}
+
+host_scheduler = HostScheduler()
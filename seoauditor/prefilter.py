@@ -0,0 +1,111 @@
+import re
+from urllib.parse import urlparse
+
+# Local checks that decide which items are worth an LLM suggestion. Alt texts, headings and anchor
+# texts that already pass them are reported as fine without a GPT call; only the rest are sent.
+
+# Screen readers cut alt text off around 125 characters.
+ALT_TEXT_MAX_LENGTH = 125
+ALT_TEXT_MIN_WORDS = 2
+# An alt text scoring below this gets a GPT suggestion.
+ALT_TEXT_PASS_SCORE = 0.7
+H1_MIN_LENGTH = 20
+H1_MAX_LENGTH = 70
+
+GENERIC_ALT_TEXTS = {"image", "img", "photo", "picture", "pic", "graphic", "icon", "logo", "banner", "thumbnail",
+                     "placeholder", "untitled", "alt", "alt text", "image description", "spacer"}
+# Screen readers already announce an image, so these openings only repeat it.
+REDUNDANT_ALT_PREFIXES = ("image of", "picture of", "photo of", "graphic of", "an image of", "a picture of", "a photo of")
+GENERIC_ANCHOR_TEXTS = {"click here", "read more", "here", "link", "more", "learn more", "this", "this page", "details",
+                        "continue", "go", "click", "this link", "more info"}
+GENERIC_HEADINGS = {"home", "home page", "homepage", "welcome", "untitled", "index", "main", "page", "blog", "news",
+                    "about", "about us", "contact", "contact us", "products", "services"}
+# Filename words of spacers and dividers, which should have an empty alt rather than a description. Words
+# such as border, pattern or texture also name products, so they are not taken as a sign on their own.
+DECORATIVE_HINTS = {"spacer", "divider", "separator", "transparent", "pixel"}
+# Images this small are spacers or tracking pixels.
+DECORATIVE_MAX_PIXELS = 2
+STOP_WORDS = {"a", "an", "and", "the", "of", "for", "to", "in", "on", "with", "at", "by", "from", "or", "is", "are",
+              "your", "our", "you", "we", "it", "this", "that", "how", "what"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg", ".bmp")
+# Camera and CMS default names such as IMG_1234, DSC01234 or image-5.
+DEFAULT_IMAGE_NAME = re.compile(r"^(img|dsc|dscn|pxl|image|photo|screenshot|untitled)[\W_]*\d*$", re.IGNORECASE)
+
+def words(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+def keywords(text):
+    return {word for word in words(text) if word not in STOP_WORDS and len(word) > 2}
+
+def page_keywords(facts):
+    # The words a page is about, from its title and H1s.
+    return keywords(" ".join([facts.title or ""] + list(facts.h1s)))
+
+def _file_stem(src):
+    name = urlparse(src).path.rsplit("/", 1)[-1]
+    return name.rsplit(".", 1)[0] if "." in name else name
+
+def looks_decorative(image, info=None):
+    # image is a PageImage; info its AssetInfo from the probe, when there is one.
+    if image.decorative:
+        return True
+    if info is not None and info.width and info.height and max(info.width, info.height) <= DECORATIVE_MAX_PIXELS:
+        return True
+    return bool(set(words(_file_stem(image.src))) & DECORATIVE_HINTS)
+
+def score_alt_text(alt, src, page_words=(), duplicate=False):
+    # (score from 0 to 1, reasons) for an existing alt text; below ALT_TEXT_PASS_SCORE it needs work.
+    text = " ".join(alt.split()).lower()
+    alt_words = words(text)
+    reasons = []
+    score = 1.0
+    if text in GENERIC_ALT_TEXTS or not alt_words:
+        return 0.0, ["is generic"]
+    if text.endswith(IMAGE_EXTENSIONS) or DEFAULT_IMAGE_NAME.match(text):
+        return 0.0, ["is a file name"]
+    if len(alt_words) < ALT_TEXT_MIN_WORDS:
+        score -= 0.4
+        reasons.append("is too short to describe the image")
+    if len(text) > ALT_TEXT_MAX_LENGTH:
+        score -= 0.3
+        reasons.append(f"is over {ALT_TEXT_MAX_LENGTH} characters")
+    if text.startswith(REDUNDANT_ALT_PREFIXES):
+        score -= 0.2
+        reasons.append("starts by saying it is an image")
+    file_words = set(words(_file_stem(src)))
+    if file_words and sum(word in file_words for word in alt_words) / len(alt_words) >= 0.8:
+        score -= 0.3
+        reasons.append("repeats the file name")
+    if duplicate:
+        score -= 0.5
+        reasons.append("is shared with other images on the page")
+    if page_words and not keywords(text) & set(page_words):
+        score -= 0.2
+        reasons.append("shares no keywords with the page title or H1")
+    return round(max(score, 0.0), 2), reasons
+
+def heading_problems(heading, title=None):
+    # Reasons a single H1 could be better; none means it is fine as it is.
+    text = " ".join(heading.split())
+    problems = []
+    if text.lower().strip(" !.") in GENERIC_HEADINGS:
+        problems.append("is generic")
+    elif len(text) < H1_MIN_LENGTH:
+        problems.append(f"is under {H1_MIN_LENGTH} characters")
+    if len(text) > H1_MAX_LENGTH:
+        problems.append(f"is over {H1_MAX_LENGTH} characters")
+    title_words = keywords(title)
+    if title_words and not keywords(text) & title_words:
+        problems.append("shares no keywords with the title")
+    return problems
+
+def anchor_text_problems(text, duplicate=False):
+    text = " ".join(text.split()).lower().strip(" .!:»>→")
+    problems = []
+    if text in GENERIC_ANCHOR_TEXTS:
+        problems.append("is generic")
+    elif text.startswith(("http://", "https://", "www.")):
+        problems.append("is a bare URL")
+    if duplicate:
+        problems.append("is used for links to different pages")
+    return problems
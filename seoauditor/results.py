@@ -0,0 +1,309 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+
+from .crawl import CrawlFrontier, crawl_site
+
+# Append-only store for audit and crawl findings. Rows are buffered and written in one transaction
+# per batch of pages, so a long run keeps only the current batch in memory and an interrupted run
+# loses at most that batch. Report queries ("pages with JSCSSSIZE", "broken links by target") run
+# against indexes. One database file holds many runs; a ResultStore reads and writes one of them.
+
+RESULT_STORE_PATH = os.environ.get("SEOAUDITOR_RESULTS", os.path.join(".cache", "results.sqlite3"))
+RESULT_STORE_BATCH = 50
+# Runs older than this are deleted by prune().
+RESULT_STORE_MAX_AGE = int(os.environ.get("SEOAUDITOR_RESULTS_MAX_AGE", 7 * 24 * 3600))
+
+# Finding codes beyond the crawlability/accessibility issue codes the audits already use.
+NO_TITLE = "NOTITLE"
+NO_META = "NOMETA"
+NO_H1 = "NOH1"
+MULTIPLE_H1 = "MULTIH1"
+BROKEN_LINK = "BROKENLINK"
+MISSING_ALT = "MISSINGALT"
+BROKEN_IMAGE = "BROKENIMG"
+IMAGE_NAME = "IMGNAME"
+OVERSIZED_IMAGE = "IMGSIZE"
+
+PageRecord = namedtuple('PageRecord', ['url', 'depth', 'status_code', 'is_html', 'title', 'meta_description', 'h1_count', 'error'])
+# target is the broken link or image a finding is about, if any; detail is free text.
+Finding = namedtuple('Finding', ['url', 'section', 'code', 'target', 'detail'])
+
+def crawl_findings(result):
+    if result.error or not result.is_html:
+        return
+    if result.title is None:
+        yield Finding(result.url, "title", NO_TITLE, None, None)
+    if result.meta_description is None:
+        yield Finding(result.url, "meta", NO_META, None, None)
+    if result.h1_count == 0:
+        yield Finding(result.url, "h1", NO_H1, None, None)
+    elif result.h1_count > 1:
+        yield Finding(result.url, "h1", MULTIPLE_H1, None, None)
+    for target in result.broken_links:
+        yield Finding(result.url, "linking", BROKEN_LINK, target, None)
+    for code in result.issue_codes:
+        yield Finding(result.url, "crawlability", code, None, None)
+    for code in result.redirect_codes:
+        yield Finding(result.url, "accessibility", code, None, None)
+
+def audit_findings(results):
+    # Findings from a run_audit/run_incremental_audit result, after a JSON round trip (tuples as lists).
+    url = results["url"]
+    sections = results.get("sections", {})
+    if sections.get("title", {}).get("title") == "No Title Found":
+        yield Finding(url, "title", NO_TITLE, None, None)
+    if "meta" in sections and sections["meta"].get("meta_description") is None:
+        yield Finding(url, "meta", NO_META, None, None)
+    optimization = sections.get("h1", {}).get("optimization")
+    if optimization == "H1 Missing":
+        yield Finding(url, "h1", NO_H1, None, None)
+    elif optimization == "Multiple H1s Found":
+        yield Finding(url, "h1", MULTIPLE_H1, None, None)
+    images = sections.get("images") or {}
+    for key, code in (("missing_alt", MISSING_ALT), ("broken_imgs", BROKEN_IMAGE), ("non_descriptive_names", IMAGE_NAME),
+                      ("oversized_imgs", OVERSIZED_IMAGE)):
+        for target in images[key][0] if key in images else ():
+            yield Finding(url, "images", code, target, None)
+    for issue in sections.get("linking") or ():
+        if "url" in issue:
+            yield Finding(url, "linking", BROKEN_LINK, issue["url"], issue["solution"])
+    for section in ("crawlability", "accessibility"):
+        for issue in sections.get(section) or ():
+            yield Finding(url, section, issue["code"], None, issue["issue"])
+
+class ResultStore:
+    def __init__(self, run_id, path=RESULT_STORE_PATH, batch_size=RESULT_STORE_BATCH):
+        self.run_id = run_id
+        self.path = path
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One long-lived connection, since batching spans many calls; the lock serializes its users.
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_urls = set()
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, started_at REAL NOT NULL, finished_at REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pages (run_id TEXT NOT NULL, url TEXT NOT NULL, depth INTEGER, "
+                               "status_code INTEGER, is_html INTEGER, title TEXT, meta_description TEXT, h1_count INTEGER, "
+                               "error TEXT, PRIMARY KEY (run_id, url))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS findings (run_id TEXT NOT NULL, url TEXT NOT NULL, section TEXT NOT NULL, "
+                               "code TEXT NOT NULL, target TEXT, detail TEXT)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS findings_code ON findings (run_id, code, url)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS findings_target ON findings (run_id, code, target) WHERE target IS NOT NULL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS findings_url ON findings (run_id, url)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sections (run_id TEXT NOT NULL, url TEXT NOT NULL, section TEXT NOT NULL, "
+                               "result BLOB NOT NULL, PRIMARY KEY (run_id, url, section))")
+            # The crawl queue in discovery order; done marks pages whose results are stored.
+            self._conn.execute("CREATE TABLE IF NOT EXISTS frontier (run_id TEXT NOT NULL, url TEXT NOT NULL, depth INTEGER NOT NULL, "
+                               "done INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (run_id, url))")
+            self._conn.execute("INSERT OR IGNORE INTO runs (run_id, started_at) VALUES (?, ?)", (run_id, time.time()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_crawl_result(self, result, queued=()):
+        # queued is what the page added to the crawl queue (see crawl_site's on_result). Seeds are pulled
+        # straight from their iterator, so a depth-0 page enters the stored frontier with its result.
+        page = PageRecord(result.url, result.depth, result.status_code, result.is_html, result.title,
+                          result.meta_description, result.h1_count, result.error)
+        if result.depth == 0:
+            queued = [(result.url, 0), *queued]
+        self._add(page, list(crawl_findings(result)), queued=queued)
+
+    def add_audit(self, results):
+        sections = results.get("sections", {})
+        fetched = bool(results.get("fetched"))
+        title = sections.get("title", {}).get("title") if fetched else None
+        meta_description = sections.get("meta", {}).get("meta_description") if fetched else None
+        page = PageRecord(results["url"], None, None, fetched, None if title == "No Title Found" else title, meta_description,
+                          None, results.get("error") or (None if fetched else "Failed to fetch"))
+        self._add(page, list(audit_findings(results)) if fetched else [], sections=sections)
+
+    def _add(self, page, findings, sections=None, queued=()):
+        with self._lock:
+            self._pending.append((page, findings, sections, queued))
+            self._pending_urls.add(page.url)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def add_to_frontier(self, queued):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO frontier (run_id, url, depth) VALUES (?, ?, ?)",
+                                   [(self.run_id, url, depth) for url, depth in queued])
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        run_id = self.run_id
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(run_id, *page) for page, _, _, _ in self._pending])
+            # A page stored again (e.g. after resuming mid-batch) replaces its findings rather than adding to them.
+            self._conn.executemany("DELETE FROM findings WHERE run_id = ? AND url = ?", [(run_id, page.url) for page, _, _, _ in self._pending])
+            self._conn.executemany("INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(run_id, *finding) for _, findings, _, _ in self._pending for finding in findings])
+            self._conn.executemany("INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?)",
+                                   [(run_id, page.url, section, zlib.compress(json.dumps(result).encode("utf-8")))
+                                    for page, _, sections, _ in self._pending for section, result in (sections or {}).items()])
+            self._conn.executemany("INSERT OR IGNORE INTO frontier (run_id, url, depth) VALUES (?, ?, ?)",
+                                   [(run_id, url, depth) for _, _, _, queued in self._pending for url, depth in queued])
+            self._conn.executemany("UPDATE frontier SET done = 1 WHERE run_id = ? AND url = ?",
+                                   [(run_id, page.url) for page, _, _, _ in self._pending])
+        self._pending = []
+        self._pending_urls = set()
+
+    def finish(self):
+        with self._lock:
+            self._flush()
+            with self._conn:
+                self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def delete(self):
+        with self._lock:
+            self._pending = []
+            self._pending_urls = set()
+            with self._conn:
+                for table in ("runs", "pages", "findings", "sections", "frontier"):
+                    self._conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (self.run_id,))
+
+    def prune(self, max_age=RESULT_STORE_MAX_AGE):
+        # Deletes every other run in the file that started more than max_age seconds ago.
+        with self._lock, self._conn:
+            old_runs = [(run_id,) for run_id, in self._conn.execute("SELECT run_id FROM runs WHERE started_at < ? AND run_id != ?",
+                                                                     (time.time() - max_age, self.run_id))]
+            for table in ("runs", "pages", "findings", "sections", "frontier"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE run_id = ?", old_runs)
+
+    def _query(self, sql, params=()):
+        # Reads see buffered rows too.
+        with self._lock:
+            self._flush()
+            return self._conn.execute(sql, (self.run_id, *params)).fetchall()
+
+    @property
+    def finished(self):
+        return self._query("SELECT finished_at FROM runs WHERE run_id = ?")[0][0] is not None
+
+    def has_page(self, url):
+        # Checked once per input URL when resuming, so it looks at the buffer instead of flushing it.
+        with self._lock:
+            return url in self._pending_urls or bool(self._conn.execute(
+                "SELECT 1 FROM pages WHERE run_id = ? AND url = ?", (self.run_id, url)).fetchone())
+
+    def page_count(self):
+        return self._query("SELECT COUNT(*) FROM pages WHERE run_id = ?")[0][0]
+
+    def page(self, url):
+        rows = self._query("SELECT url, depth, status_code, is_html, title, meta_description, h1_count, error "
+                           "FROM pages WHERE run_id = ? AND url = ?", (url,))
+        return PageRecord(*rows[0]) if rows else None
+
+    def failed_pages(self, limit=-1):
+        return self._query("SELECT url, error FROM pages WHERE run_id = ? AND error IS NOT NULL ORDER BY url LIMIT ?", (limit,))
+
+    def failed_page_count(self):
+        return self._query("SELECT COUNT(*) FROM pages WHERE run_id = ? AND error IS NOT NULL")[0][0]
+
+    def pages_with(self, code, limit=-1):
+        return [url for url, in self._query("SELECT DISTINCT url FROM findings WHERE run_id = ? AND code = ? ORDER BY url LIMIT ?",
+                                            (code, limit))]
+
+    def code_counts(self, section=None):
+        # {code: number of pages}, optionally for one section.
+        if section is None:
+            rows = self._query("SELECT code, COUNT(DISTINCT url) FROM findings WHERE run_id = ? GROUP BY code")
+        else:
+            rows = self._query("SELECT code, COUNT(DISTINCT url) FROM findings WHERE run_id = ? AND section = ? GROUP BY code", (section,))
+        return dict(rows)
+
+    def targets(self, code=BROKEN_LINK, limit=-1):
+        # (target, number of linking pages) pairs, most linked first.
+        return self._query("SELECT target, COUNT(DISTINCT url) AS pages FROM findings WHERE run_id = ? AND code = ? "
+                           "AND target IS NOT NULL GROUP BY target ORDER BY pages DESC, target LIMIT ?", (code, limit))
+
+    def target_count(self, code=BROKEN_LINK):
+        return self._query("SELECT COUNT(DISTINCT target) FROM findings WHERE run_id = ? AND code = ? AND target IS NOT NULL",
+                           (code,))[0][0]
+
+    def sources(self, target, code=BROKEN_LINK, limit=-1):
+        return [url for url, in self._query("SELECT DISTINCT url FROM findings WHERE run_id = ? AND code = ? AND target = ? "
+                                            "ORDER BY url LIMIT ?", (code, target, limit))]
+
+    def entry_problems(self, codes, limit=-1):
+        # (url, status_code, error, codes) for the pages a crawl started from (depth 0: the seed URL and
+        # any sitemap entries) that failed, returned an error status or have findings with one of codes.
+        placeholders = ", ".join("?" * len(codes))
+        rows = self._query("SELECT p.url, p.status_code, p.error, f.codes FROM pages p LEFT JOIN "
+                           f"(SELECT url, GROUP_CONCAT(code) AS codes FROM findings WHERE run_id = ? AND code IN ({placeholders}) "
+                           "GROUP BY url) f ON f.url = p.url WHERE p.run_id = ? AND p.depth = 0 "
+                           "AND (p.error IS NOT NULL OR p.status_code >= 400 OR f.codes IS NOT NULL) ORDER BY p.url LIMIT ?",
+                           (*codes, self.run_id, limit))
+        return [(url, status_code, error, codes.split(",") if codes else []) for url, status_code, error, codes in rows]
+
+    def findings(self, url):
+        return [Finding(*row) for row in self._query("SELECT url, section, code, target, detail FROM findings "
+                                                     "WHERE run_id = ? AND url = ?", (url,))]
+
+    def sections(self, url):
+        return {section: json.loads(zlib.decompress(result)) for section, result in
+                self._query("SELECT section, result FROM sections WHERE run_id = ? AND url = ?", (url,))}
+
+    def load_frontier(self, seed_url, max_pages=100, max_depth=3, seeds=None):
+        # The stored crawl queue: every discovered URL counts as seen, and those not yet stored are
+        # queued again in discovery order. Returns None when this run has not crawled anything yet.
+        rows = self._query("SELECT url, depth, done FROM frontier WHERE run_id = ? ORDER BY rowid")
+        if not rows:
+            return None
+        return CrawlFrontier(seed_url, max_pages, max_depth, seen=[url for url, _, _ in rows],
+                             queue=[(url, depth) for url, depth, done in rows if not done], seeds=seeds)
+
+def open_run(name, path=RESULT_STORE_PATH):
+    # A ResultStore for the newest unfinished run called name or name@<start>, so an interrupted run
+    # resumes. A finished run is never reopened: running the same command again starts name@<start>.
+    run_id = None
+    if os.path.exists(path):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            prefix = name + "@"
+            row = conn.execute("SELECT run_id FROM runs WHERE (run_id = ? OR substr(run_id, 1, ?) = ?) AND finished_at IS NULL "
+                               "ORDER BY started_at DESC LIMIT 1", (name, len(prefix), prefix)).fetchone()
+            run_id = row[0] if row else None
+        except sqlite3.OperationalError:
+            # No runs table yet.
+            pass
+        finally:
+            conn.close()
+    if run_id is None:
+        run_id = f"{name}@{time.strftime('%Y-%m-%dT%H:%M:%S')}-{uuid.uuid4().hex[:6]}"
+    return ResultStore(run_id, path)
+
+def stored_crawl(seed_url, store, max_pages=100, max_depth=3, max_workers=8, seeds=None):
+    # crawl_site that records every result in store and resumes where the store's run left off.
+    # Seeds already stored are skipped on resume, since they count as seen.
+    frontier = store.load_frontier(seed_url, max_pages, max_depth, seeds)
+    if frontier is None:
+        frontier = CrawlFrontier(seed_url, max_pages, max_depth, seeds=seeds)
+        store.add_to_frontier(frontier.queue)
+    yield from crawl_site(seed_url, max_pages, max_depth, max_workers, frontier=frontier, on_result=store.add_crawl_result)
+    store.finish()
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import re
+import zlib
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+from xml.etree import ElementTree
+
+import requests
+
+from .fetch import http_request, normalize_url, robots_cache
+
+logger = logging.getLogger(__name__)
+
+# Sitemap ingestion for seeding large audits. Sitemaps are found through robots.txt, and sitemap
+# indexes and (gzipped) sitemaps are parsed while they download, so URLs reach the audit queue
+# before a multi-megabyte file has finished. Only the current <url> element and an 8-byte digest
+# per distinct URL are ever held in memory.
+
+# The protocol caps a sitemap at 50 MB uncompressed; anything far beyond that is not a sitemap.
+SITEMAP_MAX_BYTES = 100 * 1024 * 1024
+# Indexes may not nest by the protocol, but some sites do it anyway.
+SITEMAP_MAX_DEPTH = 3
+# accessibility_insights codes that make a sitemap entry wrong: sitemaps should list final, working URLs.
+SITEMAP_ISSUE_CODES = ("URLRES", "PERMREDIR", "TEMPREDIR", "REDIRCHAIN")
+
+# sitemap is the sitemap file that listed the URL; lastmod is an aware datetime or None.
+SitemapEntry = namedtuple('SitemapEntry', ['url', 'lastmod', 'sitemap'])
+
+class SitemapTooLarge(Exception):
+    pass
+
+def parse_lastmod(value):
+    # W3C datetime: "2024-05-01", "2024-05-01T10:00:00+02:00" or with "Z". Naive values are taken as UTC.
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def discover_sitemaps(site_url, robots=None):
+    # Sitemap: lines from robots.txt, or the conventional /sitemap.xml when there are none.
+    parts = urlparse(site_url)
+    sitemaps = (robots or robots_cache).parser(site_url).site_maps()
+    return sitemaps or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+
+def is_sitemap_url(target_url):
+    path = urlparse(target_url).path.lower()
+    return path.endswith((".xml", ".xml.gz")) or "sitemap" in path.rsplit("/", 1)[-1]
+
+def _gunzip(chunks):
+    # Inflates at most 1 MB per step, so a small gzip bomb can't expand in one go.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk, 1024 * 1024)
+            chunk = decompressor.unconsumed_tail
+
+def _prepend(first, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+def iter_sitemap_file(sitemap_url):
+    # Yields ("url" or "sitemap", loc, lastmod) for each entry of one sitemap or sitemap index as it
+    # is parsed. Gzipped files are recognised by their magic bytes, whatever they are called.
+    response = http_request(sitemap_url, stream=True)
+    try:
+        if response.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {response.status_code} for {sitemap_url}", response=response)
+        chunks = response.iter_content(64 * 1024)
+        first = next(chunks, b"")
+        chunks = _gunzip(_prepend(first, chunks)) if first[:2] == b"\x1f\x8b" else _prepend(first, chunks)
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        root = None
+        total = 0
+        for data in chunks:
+            total += len(data)
+            if total > SITEMAP_MAX_BYTES:
+                raise SitemapTooLarge(f"{sitemap_url} exceeds {SITEMAP_MAX_BYTES} bytes")
+            parser.feed(data)
+            for event, element in parser.read_events():
+                if root is None:
+                    root = element
+                if event != "end" or _local_name(element.tag) not in ("url", "sitemap"):
+                    continue
+                loc = lastmod = None
+                for child in element:
+                    name = _local_name(child.tag)
+                    if name == "loc":
+                        loc = (child.text or "").strip()
+                    elif name == "lastmod":
+                        lastmod = parse_lastmod(child.text)
+                # Finished entries are dropped from the tree so it never grows with the file.
+                root.clear()
+                if loc:
+                    # Locations are absolute by the protocol; urljoin is only for the sites that break it.
+                    if not loc.startswith(("http://", "https://")):
+                        loc = urljoin(sitemap_url, loc)
+                    yield _local_name(element.tag), loc, lastmod
+        parser.close()
+    finally:
+        response.close()
+
+def _digest(target_url):
+    return int.from_bytes(hashlib.blake2b(target_url.encode("utf-8"), digest_size=8).digest(), "little")
+
+class SitemapReader:
+    # Iterates the distinct page URLs of a site's sitemaps as SitemapEntry records. url is a site
+    # URL (sitemaps come from its robots.txt) or a sitemap/index URL. include/exclude are regex
+    # patterns searched in each URL; since drops entries (and child sitemaps) last modified before it.
+    def __init__(self, url, include=(), exclude=(), since=None, max_urls=None, robots=None):
+        self.url = url
+        self.include = [re.compile(pattern) for pattern in include]
+        self.exclude = [re.compile(pattern) for pattern in exclude]
+        self.since = since
+        self.max_urls = max_urls
+        self.robots = robots
+        self.sitemaps_read = []
+        self.errors = []
+        self.urls_listed = 0
+        self.duplicates = 0
+        self.filtered = 0
+        self.urls_yielded = 0
+
+    def start_sitemaps(self):
+        return [self.url] if is_sitemap_url(self.url) else discover_sitemaps(self.url, self.robots)
+
+    def _wanted(self, target_url, lastmod):
+        if self.since is not None and lastmod is not None and lastmod < self.since:
+            return False
+        if self.include and not any(pattern.search(target_url) for pattern in self.include):
+            return False
+        return not any(pattern.search(target_url) for pattern in self.exclude)
+
+    def __iter__(self):
+        queue = deque((sitemap_url, 0) for sitemap_url in self.start_sitemaps())
+        seen_sitemaps = {sitemap_url for sitemap_url, _ in queue}
+        # One 8-byte digest per distinct URL rather than the URL itself.
+        seen_urls = set()
+        while queue:
+            sitemap_url, depth = queue.popleft()
+            self.sitemaps_read.append(sitemap_url)
+            try:
+                for kind, loc, lastmod in iter_sitemap_file(sitemap_url):
+                    if kind == "sitemap":
+                        if depth < SITEMAP_MAX_DEPTH and loc not in seen_sitemaps and \
+                                (self.since is None or lastmod is None or lastmod >= self.since):
+                            seen_sitemaps.add(loc)
+                            queue.append((loc, depth + 1))
+                        continue
+                    self.urls_listed += 1
+                    if not loc.startswith(("http://", "https://")):
+                        continue
+                    page_url = normalize_url(loc)
+                    digest = _digest(page_url)
+                    if digest in seen_urls:
+                        self.duplicates += 1
+                        continue
+                    seen_urls.add(digest)
+                    if not self._wanted(page_url, lastmod):
+                        self.filtered += 1
+                        continue
+                    self.urls_yielded += 1
+                    yield SitemapEntry(page_url, lastmod, sitemap_url)
+                    if self.max_urls is not None and self.urls_yielded >= self.max_urls:
+                        return
+            except (requests.RequestException, ElementTree.ParseError, SitemapTooLarge, zlib.error) as e:
+                self.errors.append((sitemap_url, str(e)))
+                logger.warning(f"Error reading sitemap {sitemap_url}: {e}")
@@ -0,0 +1,33 @@
+from seoauditor.results import open_run
+
+def audit(url):
+    return {"url": url, "fetched": True, "sections": {"title": {"title": "A page"}}}
+
+def test_unfinished_run_resumes(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    with open_run("cli:urls.txt", path) as store:
+        store.add_audit(audit("https://example.com/"))
+        run_id = store.run_id
+    with open_run("cli:urls.txt", path) as store:
+        assert store.run_id == run_id
+        assert store.has_page("https://example.com/")
+
+def test_finished_run_is_not_reopened(tmp_path):
+    # The same nightly command must audit every URL again once the previous run has finished.
+    path = str(tmp_path / "results.sqlite3")
+    with open_run("cli:urls.txt", path) as store:
+        store.add_audit(audit("https://example.com/"))
+        store.finish()
+        run_id = store.run_id
+    with open_run("cli:urls.txt", path) as store:
+        assert store.run_id != run_id
+        assert store.run_id.startswith("cli:urls.txt@")
+        assert not store.finished
+        assert not store.has_page("https://example.com/")
+
+def test_runs_with_other_names_are_ignored(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    with open_run("cli:a.txt", path) as store:
+        store.add_audit(audit("https://example.com/"))
+    with open_run("cli:a", path) as store:
+        assert not store.has_page("https://example.com/")